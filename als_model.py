@@ -0,0 +1,267 @@
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from hybrid import RATING_SCALE
+from metrics import inc, stage
+
+
+# Bumped whenever the on-disk layout changes; older models are ignored
+ALS_FORMAT = 1
+
+ALS_DIR = os.environ.get('RECS_ALS_DIR', 'models')
+
+# File inside ALS_DIR naming the model workers should serve
+CURRENT_POINTER = 'CURRENT'
+
+# Published models kept on disk, newest first
+ALS_KEEP = int(os.environ.get('ALS_KEEP', 3))
+
+# Seconds between a worker's checks for a newly published model
+ALS_POLL_INTERVAL = float(os.environ.get('ALS_POLL_INTERVAL', 5.0))
+
+ALS_FACTORS = int(os.environ.get('ALS_FACTORS', 32))
+ALS_ITERATIONS = int(os.environ.get('ALS_ITERATIONS', 10))
+ALS_REGULARIZATION = float(os.environ.get('ALS_REGULARIZATION', 0.1))
+
+# Implicit mode treats ratings as confidence 1 + ALS_ALPHA * rating in a watched/not-watched signal
+ALS_IMPLICIT = os.environ.get('ALS_IMPLICIT', '0') == '1'
+ALS_ALPHA = float(os.environ.get('ALS_ALPHA', 10.0))
+
+
+##################### Solving ################
+# Least-squares factor for one row given the fixed factors of the columns it
+# rated. Explicit mode fits the mean-centered ratings with the regularization
+# scaled by the number of ratings (ALS-WR); implicit mode fits preference 1
+# on the rated columns and 0 elsewhere, weighting each rated column by its
+# confidence, with gram = fixed.T @ fixed accounting for all the zeros.
+def solve_row(fixed, cols, values, reg, mean=0.0, implicit=False, alpha=ALS_ALPHA, gram=None):
+    factors = fixed.shape[1]
+    rated = fixed[cols]
+    if implicit:
+        confidence = alpha * values
+        a = gram + (rated.T * confidence) @ rated + reg * np.eye(factors)
+        b = rated.T @ (1 + confidence)
+    else:
+        a = rated.T @ rated + reg * len(cols) * np.eye(factors)
+        b = rated.T @ (values - mean)
+    return np.linalg.solve(a, b)
+
+
+def _solve_rows(matrix, fixed, reg, mean, implicit, alpha):
+    gram = fixed.T @ fixed if implicit else None
+    solved = np.zeros((matrix.shape[0], fixed.shape[1]))
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        if start < end:
+            solved[row] = solve_row(fixed, matrix.indices[start:end], matrix.data[start:end], reg, mean, implicit, alpha, gram)
+    return solved
+
+
+# Alternating least squares over a users x courses CSR matrix of ratings.
+# Returns (user factors, item factors, global mean).
+def train(matrix, factors=ALS_FACTORS, iterations=ALS_ITERATIONS, reg=ALS_REGULARIZATION,
+          implicit=ALS_IMPLICIT, alpha=ALS_ALPHA, seed=42):
+    matrix = matrix.tocsr().astype(np.float64)
+    by_item = matrix.T.tocsr()
+    mean = 0.0 if implicit or not matrix.nnz else float(matrix.data.mean())
+
+    rng = np.random.default_rng(seed)
+    user_factors = np.zeros((matrix.shape[0], factors))
+    item_factors = rng.normal(scale=0.1, size=(matrix.shape[1], factors))
+    for _ in range(iterations):
+        user_factors = _solve_rows(matrix, item_factors, reg, mean, implicit, alpha)
+        item_factors = _solve_rows(by_item, user_factors, reg, mean, implicit, alpha)
+    return user_factors.astype(np.float32), item_factors.astype(np.float32), mean
+
+
+# Root mean squared error of the model's predictions for the stored ratings
+def rmse(matrix, user_factors, item_factors, mean):
+    coo = matrix.tocoo()
+    if not coo.nnz:
+        return 0.0
+    predicted = mean + np.einsum('ij,ij->i', user_factors[coo.row], item_factors[coo.col])
+    return float(np.sqrt(np.mean((predicted - coo.data) ** 2)))
+
+
+##################### Reading ################
+# A published ALS model opened with mmap.
+#
+# user_ids.npy is sorted and aligned with user_factors.npy; course_ids.npy is
+# aligned with item_factors.npy. Scoring a user is one product of their
+# factor with the item factors, so its cost depends on the number of courses
+# and factors only. Users the model has not seen, or whose ratings changed
+# since training, are folded in from their current ratings.
+class ALSModel:
+    def __init__(self, path):
+        with open(os.path.join(path, 'meta.json')) as meta_file:
+            self.meta = json.load(meta_file)
+        if self.meta.get('format') != ALS_FORMAT:
+            raise ValueError(f"Unsupported ALS model format {self.meta.get('format')}")
+
+        self.path = path
+        self.name = os.path.basename(path)
+        self.mean = self.meta['mean']
+        self.implicit = self.meta['implicit']
+        self.reg = self.meta['reg']
+        self.alpha = self.meta['alpha']
+        self.ratings_generation = self.meta['ratings_generation']
+        self.user_ids = np.load(os.path.join(path, 'user_ids.npy'), mmap_mode='r')
+        self.course_ids = np.load(os.path.join(path, 'course_ids.npy'), mmap_mode='r')
+        self.user_factors = np.load(os.path.join(path, 'user_factors.npy'), mmap_mode='r')
+        self.item_factors = np.asarray(np.load(os.path.join(path, 'item_factors.npy'), mmap_mode='r'))
+        self._course_order = np.argsort(self.course_ids, kind='stable')
+        self._gram = self.item_factors.T.astype(np.float64) @ self.item_factors if self.implicit else None
+
+    def user_vector(self, user_id):
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        row = int(np.searchsorted(self.user_ids, user_id))
+        if row < len(self.user_ids) and self.user_ids[row] == user_id:
+            return np.asarray(self.user_factors[row])
+        return None
+
+    # Item positions of course ids, -1 for courses the model has not seen
+    def course_positions(self, course_ids):
+        course_ids = np.asarray(course_ids, dtype=self.course_ids.dtype)
+        if not len(self.course_ids):
+            return np.full(len(course_ids), -1)
+        sorted_ids = self.course_ids[self._course_order]
+        found = np.minimum(np.searchsorted(sorted_ids, course_ids), len(sorted_ids) - 1)
+        return np.where(sorted_ids[found] == course_ids, self._course_order[found], -1)
+
+    # User factor solved against the fixed item factors, for a user's current ratings
+    def fold_in(self, course_ids, ratings):
+        positions = self.course_positions(course_ids)
+        known = positions >= 0
+        if not known.any():
+            return None
+        vector = solve_row(self.item_factors, positions[known], np.asarray(ratings, dtype=np.float64)[known],
+                           self.reg, self.mean, self.implicit, self.alpha, self._gram)
+        return vector.astype(np.float32)
+
+    # Predicted rating of every course in item_factors order
+    def predict(self, vector):
+        with stage('als_predict'):
+            scores = self.item_factors @ vector
+        low, high = RATING_SCALE
+        if self.implicit:
+            return low + (high - low) * np.clip(scores, 0, 1)
+        return np.clip(self.mean + scores, low, high)
+
+
+# Hands out the published model, re-reading the pointer at most every
+# ALS_POLL_INTERVAL seconds so a newly trained model replaces the old one in
+# every worker without a restart
+class ALSModelStore:
+    def __init__(self, root=ALS_DIR, poll_interval=ALS_POLL_INTERVAL):
+        self.root = root
+        self.poll_interval = poll_interval
+        self._model = None
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        if self._checked is not None and time.monotonic() - self._checked < self.poll_interval:
+            return self._model
+        with self._lock:
+            if self._checked is None or time.monotonic() - self._checked >= self.poll_interval:
+                self._checked = time.monotonic()
+                try:
+                    with open(os.path.join(self.root, CURRENT_POINTER)) as pointer:
+                        name = pointer.read().strip()
+                    if self._model is None or self._model.name != name:
+                        self._model = ALSModel(os.path.join(self.root, name))
+                        inc('model_rebuilds_total', model='als_swap')
+                except (OSError, ValueError, KeyError):
+                    pass
+        return self._model
+
+
+##################### Training ################
+# Train on the latest ratings in the store and publish the model atomically
+def build_model(store, root=ALS_DIR, factors=ALS_FACTORS, iterations=ALS_ITERATIONS, reg=ALS_REGULARIZATION,
+                implicit=ALS_IMPLICIT, alpha=ALS_ALPHA):
+    from ratings_matrix import RatingsMatrix
+
+    generation = store.max_seq()
+    ratings = RatingsMatrix.from_frame(store.load_latest(up_to=generation))
+    matrix = ratings.matrix()
+    with stage('als_train'):
+        user_factors, item_factors, mean = train(matrix, factors, iterations, reg, implicit, alpha)
+    inc('model_rebuilds_total', model='als')
+
+    name = time.strftime('als-%Y%m%d-%H%M%S') + f'-{os.getpid()}'
+    path = os.path.join(root, name)
+    os.makedirs(path + '.tmp')
+    np.save(os.path.join(path + '.tmp', 'user_ids.npy'), np.asarray(ratings.user_ids, dtype=np.int64))
+    np.save(os.path.join(path + '.tmp', 'course_ids.npy'), np.asarray(ratings.course_ids))
+    np.save(os.path.join(path + '.tmp', 'user_factors.npy'), user_factors)
+    np.save(os.path.join(path + '.tmp', 'item_factors.npy'), item_factors)
+
+    meta = {
+        'format': ALS_FORMAT,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'ratings_generation': generation,
+        'factors': factors,
+        'iterations': iterations,
+        'reg': reg,
+        'implicit': implicit,
+        'alpha': alpha,
+        'mean': mean,
+        'train_rmse': None if implicit else rmse(matrix, user_factors, item_factors, mean),
+        'counts': {'user': len(ratings.user_ids), 'course': len(ratings.course_ids), 'rating': int(matrix.nnz)},
+    }
+    with open(os.path.join(path + '.tmp', 'meta.json'), 'w') as meta_file:
+        json.dump(meta, meta_file, indent=2)
+    os.rename(path + '.tmp', path)
+
+    # Point the workers at the new model atomically
+    pointer = os.path.join(root, CURRENT_POINTER)
+    with open(pointer + '.tmp', 'w') as pointer_file:
+        pointer_file.write(name + '\n')
+    os.replace(pointer + '.tmp', pointer)
+    _prune(root, keep=ALS_KEEP)
+    return path, meta
+
+
+# Delete all but the newest keep models; workers still reading one keep their open mmaps
+def _prune(root, keep):
+    names = sorted((name for name in os.listdir(root) if name.startswith('als-') and not name.endswith('.tmp')),
+                   key=lambda name: os.path.getmtime(os.path.join(root, name)), reverse=True)
+    for name in names[keep:]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+if __name__ == '__main__':
+    from ratings_store import RatingsStore
+
+    parser = argparse.ArgumentParser(description='Train the ALS matrix-factorization model on the ratings store and publish it.')
+    parser.add_argument('--factors', type=int, default=ALS_FACTORS)
+    parser.add_argument('--iterations', type=int, default=ALS_ITERATIONS)
+    parser.add_argument('--reg', type=float, default=ALS_REGULARIZATION)
+    parser.add_argument('--implicit', action='store_true', default=ALS_IMPLICIT)
+    parser.add_argument('--alpha', type=float, default=ALS_ALPHA)
+    parser.add_argument('--out', default=ALS_DIR, help='model directory')
+    parser.add_argument('--interval', type=float, default=0, help='retrain every N seconds when new ratings arrive (default: train once)')
+    args = parser.parse_args()
+
+    store = RatingsStore()
+    trained_generation = None
+    while True:
+        if store.max_seq() != trained_generation:
+            started = time.time()
+            path, meta = build_model(store, args.out, args.factors, args.iterations, args.reg, args.implicit, args.alpha)
+            trained_generation = meta['ratings_generation']
+            counts = ', '.join(f'{count} {kind}s' for kind, count in meta['counts'].items())
+            print(f"Wrote {path} ({counts}, train RMSE {meta['train_rmse']}) in {time.time() - started:.1f}s.", flush=True)
+        if not args.interval:
+            break
+        time.sleep(args.interval)
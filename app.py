@@ -1,81 +1,447 @@
-from flask import Flask, render_template, request, jsonify
-import pandas as pd
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.neighbors import NearestNeighbors
+from startup_timing import timed, lazy_import, lazy_load, start_warmup, LAZY_STARTUP, WARMUP
+import startup_timing
+
+with timed('import', 'flask, pandas, numpy'):
+    from flask import Flask, render_template, request, jsonify, make_response, Response, stream_with_context
+    import pandas as pd
+    import numpy as np
 from datetime import datetime
-import pygwalker as pyg
 import os
-import plotly.express as px
-from recommendation_system import recommend_courses_by_subdomain, domain_df, subdomains_df
-import markdown
+import json
+import queue
+import threading
 from markupsafe import Markup
-from eda import create_visualization  # Correct import from eda.py
+with timed('import', 'recommenders (scikit-learn, scipy)'):
+    import recommendation_system
+    from recommendation_system import recommend_courses_by_subdomain, recommend_courses_across_subdomains
+    from data_loader import load_csv
+    from content_index import ContentIndex, top_k_indices
+    from ratings_matrix import RatingsMatrix
+    from neighbors import UserNeighbors, CF_NEIGHBORS
+    from item_similarity import ItemSimilarity
+    from ratings_store import RatingsStore
+    from rating_ingest import RatingIngestor
+    from precompute import load_artifact
+    from dashboard_cache import DashboardCache
+    from batch_recommend import BATCH_CHUNK_SIZE, content_scores, item_cf_scores, ranked_lists
+    from http_cache import PayloadCache, serve_static
+    from hybrid import HYBRID_TOP_N, RATING_SCALE, blend, hydrate
+    from executor import RecommendationExecutor, Saturated
+    from als_model import ALSModelStore
+    from result_cache import ResultCache
+    from skillgap import SkillGapIndex, split_skills
+    from search_index import SearchIndex
+    from metrics import instrument, stage, cache_result
+    import profiler
 
 app = Flask(__name__)
 
-@app.route('/skillgap')
-def skillgap():
-    return render_template('skillgap.html')
+# static/ is served by WhiteNoise with far-future caching and versioned URLs
+serve_static(app)
+
+# Per-route latency histograms and stage timers, exposed on /metrics
+instrument(app)
+
+# Admin-only sampling profiler: /admin/profile and per-request X-Profile
+profiler.register(app)
 
 # Load data
-courses_df = pd.read_csv('courses.csv')
-ratings_df = pd.read_csv('ratings.csv') if pd.io.common.file_exists('ratings.csv') else pd.DataFrame()
-wdata_df = pd.read_csv('WData2.csv', encoding='latin1')
+COURSES_CSV = 'courses.csv'
+
+with timed('data', 'courses.csv'):
+    courses_df = load_csv(COURSES_CSV)
+
+# The analytics stack is only needed by the dashboard routes, so it is imported
+# and loaded on first use (or by the warm-up thread) unless LAZY_STARTUP=0
+ANALYTICS_MODULES = ('pygwalker', 'eda', 'markdown')
+get_wdata = lazy_load('WData2.csv', lambda: load_csv('WData2.csv'))
+
+if not LAZY_STARTUP:
+    for module_name in ANALYTICS_MODULES:
+        lazy_import(module_name)
+    get_wdata()
+
+
+# Start preloading the deferred stack once this worker is serving requests
+@app.before_request
+def warm_up_analytics():
+    if LAZY_STARTUP and WARMUP:
+        start_warmup(ANALYTICS_MODULES, [get_wdata])
+
+
+@app.route('/startup')
+def startup_report():
+    return jsonify(startup_timing.report())
+
+
+# Ratings live in an append-only store; the first start imports ratings.csv
+with timed('data', 'ratings store'):
+    ratings_store = RatingsStore()
+    ratings_generation = ratings_store.max_seq()
+    ratings_df = ratings_store.load_latest(up_to=ratings_generation)
+
+# Content index is fitted once per catalog, not per request
+with timed('data', 'content index'):
+    content_index = ContentIndex(courses_df)
+    course_row_index = pd.Series(np.arange(len(courses_df)), index=courses_df['course_id'])
+    # Course records by row, copied into responses only for the final recommendations
+    course_records = courses_df.to_dict(orient='records')
+
+# Bumped every time courses.csv is reloaded (refresh_courses_if_changed)
+courses_version = 0
+
+# User-course matrix is built once from the history and then updated in place
+with timed('data', 'ratings matrix and CF models'):
+    ratings_matrix = RatingsMatrix.from_frame(ratings_df)
+    user_neighbors = UserNeighbors(ratings_matrix)
+    item_similarity = ItemSimilarity(ratings_matrix)
+
+
+# Apply ratings read back from the store to the in-memory recommendation state
+def apply_ratings(ratings):
+    for user_id, course_id, rating in ratings:
+        users_rated_since_artifact.add(user_id)
+        users_rated_since_als.add(user_id)
+        user_versions[user_id] = user_versions.get(user_id, 0) + 1
+        previous = ratings_matrix.upsert(user_id, course_id, rating)
+        user_neighbors.update_user(user_id)
+        item_similarity.update(user_id, course_id, previous, rating)
+
+
+# Ratings are written by a background thread; every worker applies new ones by generation
+rating_ingestor = RatingIngestor(ratings_store, apply_ratings, ratings_generation)
+
+# Offline precomputed recommendations (precompute.py), served by lookup when present.
+# Users who rated after the artifact was built are scored live.
+with timed('data', 'precomputed artifact'):
+    precomputed = load_artifact()
+precomputed_catalog_version = recommendation_system.catalog_version
+users_rated_since_artifact = set()
+
+# Cached CF results are kept until the CF models are rebuilt or replaced
+# (cf_model_generation) and, with CF_MODE=als, until the user rates again
+user_versions = {}
+cf_model_generation = 0
+if precomputed is not None:
+    users_rated_since_artifact.update(row[1] for row in ratings_store.since(precomputed.ratings_generation))
+
+# Collaborative filtering mode: 'user' (neighbor users), 'item' (course-course
+# table) or 'als' (matrix factorization published by als_model.py)
+CF_MODE = os.environ.get('CF_MODE', 'user')
+
+# ALS models are trained by a separate job; each worker swaps to a newly
+# published one on its next request. Users who rated after the model's
+# training data are folded in from their current ratings.
+als_models = ALSModelStore()
+als_state = (None, None)
+users_rated_since_als = set()
+als_swap_lock = threading.Lock()
+
+
+##################### Catalog Refresh ################
+def _courses_signature():
+    stat = os.stat(COURSES_CSV)
+    return stat.st_mtime_ns, stat.st_size
+
+
+courses_signature = _courses_signature()
+_courses_lock = threading.Lock()
+
+
+# Reload courses.csv and refit the content index when the file changes, like
+# recommendation_system.refresh_if_changed does for the subdomain catalog.
+# Everything holding row numbers of the old catalog goes with it: cached
+# results (versioned by courses_version), the precomputed artifact, and the
+# ALS model's course rows.
+def refresh_courses_if_changed():
+    global courses_df, content_index, course_row_index, course_records
+    global courses_signature, courses_version, precomputed, als_state
+    if _courses_signature() == courses_signature:
+        return False
+    with _courses_lock:
+        signature = _courses_signature()
+        if signature == courses_signature:
+            return False
+        frame = load_csv(COURSES_CSV)
+        index = ContentIndex(frame)
+        row_index = pd.Series(np.arange(len(frame)), index=frame['course_id'])
+        records = frame.to_dict(orient='records')
+        with als_swap_lock:
+            courses_df, content_index, course_row_index, course_records = frame, index, row_index, records
+            precomputed = None
+            als_state = (None, None)
+            courses_signature = signature
+            courses_version += 1
+    return True
+
+
+@app.before_request
+def refresh_courses():
+    refresh_courses_if_changed()
+
+# Scoring runs in a pool of processes that import this module once each
+# (EXECUTOR_WORKERS, off by default); requests only send ids and get rows back
+recommendation_executor = RecommendationExecutor('app')
+
+
+# Spawn the pool once this worker is serving requests, not in scripts that import the app
+@app.before_request
+def start_executor():
+    recommendation_executor.start()
+
+
+# Recommendation results by normalized query and data version, with identical
+# concurrent misses sharing one computation
+recommendation_results = ResultCache()
+
+
+def normalize_job_role(job_role):
+    return ' '.join((job_role or '').split())
+
+
+def cached_content_scores(job_role):
+    job_role = normalize_job_role(job_role)
+    return recommendation_results.submit(
+        ('content', job_role), courses_version,
+        lambda: recommendation_executor.submit(content_based_scores, job_role))
+
+
+def cached_collaborative_scores(user_id):
+    rating_ingestor.sync()
+    if CF_MODE == 'als' and current_als_model()[0] is not None:
+        # Scores depend only on the published model and the user's own ratings
+        version = ('als', courses_version, cf_model_generation, user_versions.get(user_id, 0))
+    else:
+        # Neighbor-based scores (also ALS mode before a model is published)
+        # change whenever anyone rates
+        version = ('neighbors', courses_version, cf_model_generation, rating_ingestor.generation)
+    return recommendation_results.submit(
+        ('cf', user_id), version,
+        lambda: recommendation_executor.submit(collaborative_filtering_scores, user_id))
+
+
+# scope='all' ranks the whole catalog by embedding similarity instead of only the subdomain's courses
+def cached_subdomain_recommendations(subdomain_id, top_n, scope=None):
+    recommend = recommend_courses_across_subdomains if scope == 'all' else subdomain_recommendations
+    recommendation_system.refresh_if_changed()
+    return recommendation_results.submit(
+        ('subdomain', subdomain_id, top_n, scope == 'all'), recommendation_system.catalog_version,
+        lambda: recommendation_executor.submit(recommend, subdomain_id, top_n))
+
+
+@app.errorhandler(Saturated)
+def executor_saturated(e):
+    response = make_response("Too many recommendation requests in progress, please retry shortly.", 503)
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+@app.errorhandler(TimeoutError)
+def executor_timeout(e):
+    return make_response("Recommendations took too long to compute, please retry.", 504)
 
 
 ##################### Content-Based Filtering ################
+# Top content matches for a job role as (row indices into courses_df, similarities)
+def content_based_scores(job_role, top_n=10):
+    refresh_courses_if_changed()
+    precomputed_recs = precomputed.lookup('job_role', job_role, top_n) if precomputed else None
+    if precomputed:
+        cache_result('artifact', precomputed_recs is not None)
+    if precomputed_recs is not None:
+        return precomputed_recs
+    return content_index.top_k(job_role, top_n)
+
+
 def content_based_recommendations(job_role):
-    vectorizer = TfidfVectorizer()
-    tfidf_matrix = vectorizer.fit_transform(courses_df['skills_required'] + ' ' + courses_df['sub_skills_required'])
-    cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
-    
-    idx = courses_df[courses_df['job_role'] == job_role].index
-    if not len(idx):
+    course_indices, _ = content_based_scores(job_role, 10)
+    if not len(course_indices):
         return pd.DataFrame()
-    
-    sim_scores = list(enumerate(cosine_sim[idx[0]]))
-    sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-    course_indices = [i[0] for i in sim_scores]
-    
-    return courses_df.iloc[course_indices[:10]]
+
+    with stage('dataframe_merge'):
+        return courses_df.iloc[course_indices]
 
 
 ###################### Collaborative Filtering ################
-def collaborative_filtering_recommendations(user_id):
-    if ratings_df.empty:
+def collaborative_filtering_recommendations(user_id, mode=None):
+    course_rows, predicted = collaborative_filtering_scores(user_id, mode, 10)
+    if not len(course_rows):
         return pd.DataFrame()
 
-    # Sort by timestamp and remove duplicates for user-course combinations
-    ratings_df_cleaned = ratings_df.sort_values(by='timestamp').drop_duplicates(subset=['user_id', 'course_id'], keep='last')
+    # Course details for the top 10 recommendations, best first
+    with stage('dataframe_merge'):
+        recommendations_df = courses_df.iloc[course_rows].reset_index(drop=True)
+        recommendations_df.insert(1, 'predicted_rating', predicted)
+    return recommendations_df
+
+
+# Top predicted ratings for courses the user has not rated, as
+# (row indices into courses_df, predicted ratings), best first
+def collaborative_filtering_scores(user_id, mode=None, top_n=10):
+    # Pick up ratings submitted through any worker since the last request
+    rating_ingestor.sync()
+    refresh_courses_if_changed()
+
+    empty = (np.empty(0, dtype=np.intp), np.empty(0))
+    if not ratings_matrix.nnz or user_id not in ratings_matrix.user_index:
+        return empty
+
+    mode = mode or CF_MODE
+    if artifact_serves(mode) and user_id not in users_rated_since_artifact:
+        precomputed_recs = precomputed.lookup('user', user_id, top_n)
+        cache_result('artifact', precomputed_recs is not None)
+        if precomputed_recs is not None:
+            return precomputed_recs
+
+    if mode == 'als':
+        recommendations = als_scores(user_id, top_n)
+        if recommendations is not None:
+            return recommendations
+        # No model has been published yet
+        mode = 'user'
+
+    if mode == 'item':
+        predicted, weight_total = item_similarity.predict(user_id)
+    else:
+        predicted, weight_total = user_based_predictions(user_id)
+        if predicted is None:
+            return empty
 
-    # Create a user-course ratings matrix
-    user_course_ratings = ratings_df_cleaned.pivot(index='user_id', columns='course_id', values='rating').fillna(0)
+    # Predict ratings for unrated courses
+    rated_cols, _ = ratings_matrix.user_ratings(user_id)
+    unrated_mask = weight_total > 0
+    unrated_mask[rated_cols[rated_cols < len(unrated_mask)]] = False
+    unrated = np.flatnonzero(unrated_mask)
+
+    # Only courses present in the catalog can be recommended
+    course_rows = course_row_index.reindex(np.asarray(ratings_matrix.course_ids)[unrated]).to_numpy()
+    in_catalog = ~np.isnan(course_rows)
+    course_rows = course_rows[in_catalog].astype(np.intp)
+    predicted = predicted[unrated][in_catalog]
+
+    top, top_scores = top_k_indices(predicted, top_n)
+    return course_rows[top], top_scores
+
+
+# Whether the artifact's user rows were scored the way mode scores now. ALS
+# rows are only valid for the model they were built with, so a hot-swapped
+# model makes them stale.
+def artifact_serves(mode):
+    if not precomputed or precomputed.cf_mode != mode:
+        return False
+    if mode == 'als':
+        model = current_als_model()[0]
+        return precomputed.meta.get('als_model') == (model.name if model is not None else None)
+    return True
+
+
+# The published ALS model with the catalog row of each of its courses (-1 if
+# not in the catalog), switching to a newly published model when there is one
+def current_als_model():
+    global als_state, users_rated_since_als, cf_model_generation
+    model = als_models.current()
+    if model is None or model is als_state[0]:
+        return als_state
+    # Threads that see the swap together must apply it once
+    with als_swap_lock:
+        if model is not als_state[0]:
+            course_rows = course_row_index.reindex(np.asarray(model.course_ids)).fillna(-1).to_numpy(dtype=np.intp)
+            users_rated_since_als = {row[1] for row in ratings_store.since(model.ratings_generation)}
+            als_state = (model, course_rows)
+            cf_model_generation += 1
+        return als_state
+
+
+def als_scores(user_id, top_n):
+    model, model_course_rows = current_als_model()
+    if model is None:
+        return None
+
+    rated_cols, ratings = ratings_matrix.user_ratings(user_id)
+    rated_course_ids = np.asarray(ratings_matrix.course_ids)[rated_cols]
+    vector = None if user_id in users_rated_since_als else model.user_vector(user_id)
+    if vector is None:
+        vector = model.fold_in(rated_course_ids, ratings)
+        if vector is None:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+    # Unrated courses that are in the catalog, by one product with the item factors
+    predicted = model.predict(vector)
+    candidates = model_course_rows >= 0
+    rated = model.course_positions(rated_course_ids)
+    candidates[rated[rated >= 0]] = False
+    items = np.flatnonzero(candidates)
+    top, top_scores = top_k_indices(predicted[items], top_n)
+    return model_course_rows[items[top]], top_scores
+
+
+def user_based_predictions(user_id):
+    # Find the top-k most similar users through the approximate neighbor index
+    neighbor_rows, similarities = user_neighbors.query(user_id, CF_NEIGHBORS)
+    if not len(neighbor_rows):
+        return None, None
+
+    # Similarity-weighted average over the neighbors who rated each course
+    neighbor_ratings = ratings_matrix.matrix()[neighbor_rows]
+    weighted_sum = neighbor_ratings.T @ similarities
+    weight_total = (neighbor_ratings != 0).T @ similarities
+    predicted = np.divide(weighted_sum, weight_total, out=np.zeros_like(weighted_sum), where=weight_total > 0)
+    return predicted, weight_total
+
+
+##################### Batch Recommendations ################
+# Recommendations for many (user_id, job_role) pairs and subdomain ids at once.
+# Pairs are scored in chunks with matrix-matrix products over the shared content
+# index and item-based CF table; results are yielded one query at a time.
+# Collaborative scores always come from the item-based table, whatever CF_MODE
+# the single-user routes use, since it is the one that scores users in bulk.
+def batch_recommendations(pairs=(), subdomain_ids=(), top_n=10):
+    rating_ingestor.sync()
+    refresh_courses_if_changed()
+
+    pairs = list(pairs)
+    for start in range(0, len(pairs), BATCH_CHUNK_SIZE):
+        chunk = pairs[start:start + BATCH_CHUNK_SIZE]
+        user_ids = [user_id for user_id, _ in chunk]
+        job_roles = [job_role for _, job_role in chunk]
+
+        content = ranked_lists(content_scores(content_index, job_roles), courses_df['course_id'], top_n)
+        collaborative = ranked_lists(item_cf_scores(item_similarity, ratings_matrix, user_ids), ratings_matrix.course_ids, top_n)
+        for (user_id, job_role), content_recs, collab_recs in zip(chunk, content, collaborative):
+            yield {'user_id': user_id, 'job_role': job_role, 'content': content_recs, 'collaborative': collab_recs}
+
+    for subdomain_id in subdomain_ids:
+        model = recommendation_system.get_subdomain_model(subdomain_id)
+        courses = []
+        if model is not None:
+            top = model.ranking[:top_n]
+            course_ids = model.related_courses['course_id'].to_numpy()[top]
+            courses = [
+                {'course_id': course_id, 'score': float(score)}
+                for course_id, score in zip(course_ids.tolist(), model.scores[top])
+            ]
+        yield {'subdomain_id': subdomain_id, 'courses': courses}
+
+
+@app.route('/api/recommendations/batch', methods=['POST'])
+def batch_recommend():
+    payload = request.get_json(silent=True) or {}
 
-    # Compute similarity between users using NearestNeighbors
-    model = NearestNeighbors(metric='cosine', algorithm='brute')
-    model.fit(user_course_ratings)
-    
     try:
-        distances, indices = model.kneighbors(user_course_ratings.loc[[user_id]], n_neighbors=len(user_course_ratings))
-    except KeyError:
-        return pd.DataFrame()
+        pairs = []
+        for query in payload.get('queries', []):
+            user_id, job_role = (query.get('user_id'), query.get('job_role')) if isinstance(query, dict) else query
+            pairs.append((None if user_id in (None, '') else int(user_id), job_role))
+        subdomain_ids = [int(subdomain_id) for subdomain_id in payload.get('subdomain_ids', [])]
+        top_n = int(payload.get('top_n', 10))
+    except (ValueError, TypeError, AttributeError):
+        return jsonify({'status': 'error', 'message': 'Invalid input.'}), 400
 
-    similar_users = user_course_ratings.index[indices.flatten()]
-    similar_users_ratings = user_course_ratings.loc[similar_users].mean(axis=0)
-    
-    # Predict ratings for unrated courses
-    user_ratings = user_course_ratings.loc[user_id]
-    recommendations = similar_users_ratings[user_ratings == 0]
-    
-    # Create a DataFrame of recommendations
-    recommendations_df = pd.DataFrame(recommendations, columns=['predicted_rating']).reset_index()
-    recommendations_df.columns = ['course_id', 'predicted_rating']
-    
-    # Merge with course details and return top 10 recommendations
-    recommendations_df = recommendations_df.merge(courses_df, on='course_id')
-    return recommendations_df.sort_values(by='predicted_rating', ascending=False).head(10)
+    def generate():
+        for result in batch_recommendations(pairs, subdomain_ids, top_n):
+            yield json.dumps(result) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 
 ##################### Index Route ################
@@ -94,14 +460,21 @@ def index():
             except ValueError:
                 return "Error: User ID must be an integer."
 
-        if user_id is None or user_id == "":
-            recommendations = content_based_recommendations(job_role)
+        # Both recommenders return course rows and scores; only the final list is turned into course records
+        content_task = cached_content_scores(job_role)
+        cf_task = None
+        if user_id is not None and user_id != "":
+            cf_task = cached_collaborative_scores(user_id)
+        content_rows, content_scores = recommendation_executor.result(content_task)
+        if cf_task is None:
+            rows, predicted = content_rows, None
         else:
-            content_recs = content_based_recommendations(job_role)
-            collab_recs = collaborative_filtering_recommendations(user_id)
-            recommendations = pd.concat([content_recs, collab_recs]).drop_duplicates()
+            cf_rows, cf_ratings = recommendation_executor.result(cf_task)
+            rows, _, predicted = blend(content_rows, content_scores, cf_rows, cf_ratings, HYBRID_TOP_N)
 
-        return render_template('index.html', job_roles=job_roles, recommendations=recommendations.to_dict(orient='records'), user_id=user_id)
+        with stage('hydrate'):
+            recommendations = hydrate(course_records, rows, predicted)
+        return render_template('index.html', job_roles=job_roles, recommendations=recommendations, user_id=user_id)
 
     return render_template('index.html', job_roles=job_roles)
 
@@ -121,91 +494,251 @@ def submit_rating():
     except (ValueError, TypeError):
         return jsonify({'status': 'error', 'message': 'Invalid input.'}), 400
 
-    try:
-        feedback_df = pd.DataFrame({'user_id': [user_id], 'course_id': [course_id], 'rating': [rating], 'timestamp': [timestamp]})
-        feedback_df.to_csv('ratings.csv', mode='a', header=not pd.io.common.file_exists('ratings.csv'), index=False)
+    # The write happens later and the log is append-only, so reject bad values now
+    low, high = RATING_SCALE
+    if not low <= rating <= high:
+        return jsonify({'status': 'error', 'message': f'Rating must be between {low} and {high}.'}), 400
+    if course_id not in course_row_index.index:
+        return jsonify({'status': 'error', 'message': 'Unknown course.'}), 400
 
-        global ratings_df
-        ratings_df = pd.read_csv('ratings.csv')
+    try:
+        rating_ingestor.submit(user_id, course_id, rating, timestamp)
+    except queue.Full:
+        return jsonify({'status': 'error', 'message': 'Too many ratings are being submitted. Please try again.'}), 503
 
-        return jsonify({'status': 'success', 'message': 'Rating submitted successfully'}), 200
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': 'Failed to save rating.'}), 500
+    return jsonify({'status': 'success', 'message': 'Rating submitted successfully'}), 202
 
 
 ##################### Get Courses by Job Role ################
+def build_course_payloads():
+    return {
+        job_role: app.json.response(courses[['course_id', 'title']].to_dict(orient='records')).get_data()
+        for job_role, courses in courses_df.groupby('job_role', sort=False)
+    }
+
+
+# Serialized once per catalog version, keyed by job role
+course_payloads = PayloadCache(lambda: courses_version, build_course_payloads)
+
+
 @app.route('/get_courses/<job_role>', methods=['GET'])
 def get_courses(job_role):
-    relevant_courses = courses_df[courses_df['job_role'] == job_role]
-    courses_list = relevant_courses[['course_id', 'title']].to_dict(orient='records')
-    return jsonify(courses_list)
+    return course_payloads.respond(job_role)
 
 
 ##################### Visualize WData Route ################
+def build_wdata_dashboard():
+    pyg = lazy_import('pygwalker')
+    walker = pyg.walk(load_csv('WData2.csv'))
+    return walker.to_html()
+
+
+# PyGWalker HTML is cached per WData2.csv content and rebuilt in the background when it changes
+wdata_dashboard = DashboardCache('wdata', 'WData2.csv', build_wdata_dashboard)
+
+
 @app.route('/visualize_wdata')
 def visualize_wdata():
     if not os.path.exists('WData2.csv'):
         return "wdata.csv not found. Please upload the dataset.", 404
 
     try:
-        wdata_df = pd.read_csv('WData2.csv', encoding='latin1')
-    except Exception as e:
-        return f"Error loading dataset: {e}"
-
-    try:
-        walker = pyg.walk(wdata_df)
-        pyg_html = walker.to_html()
+        dashboard = wdata_dashboard.get()
     except Exception as e:
         return f"Error generating PyGWalker visualization: {e}"
 
-    return render_template('visualize.html', pyg_html=pyg_html)
+    # Browsers revalidate with If-None-Match and get a 304 while the dashboard is unchanged
+    if request.if_none_match.contains(dashboard['etag']):
+        response = app.response_class(status=304)
+    else:
+        response = make_response(render_template('visualize.html', pyg_html=dashboard['html']))
+    response.set_etag(dashboard['etag'])
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 
 ##################### Domain Route ################
+def build_domain_page():
+    domains = recommendation_system.domain_df.to_dict(orient='records')
+    return {None: render_template('domain.html', domains=domains).encode('utf-8')}
+
+
+domain_page = PayloadCache(lambda: recommendation_system.catalog_version, build_domain_page, mimetype='text/html')
+
+
 @app.route('/domain')
 def domain():
-    domains = domain_df.to_dict(orient='records')
-    return render_template('domain.html', domains=domains)
+    return domain_page.respond()
 
 
 ##################### Get Subdomains ################
+def build_subdomain_payloads():
+    subdomains_df = recommendation_system.subdomains_df
+    return {
+        int(domain_id): app.json.response(subdomains.to_dict(orient='records')).get_data()
+        for domain_id, subdomains in subdomains_df.groupby('domain_id', sort=False)
+    }
+
+
+# Fetched by domain.html on every domain change; answered from prebuilt bodies
+subdomain_payloads = PayloadCache(lambda: recommendation_system.catalog_version, build_subdomain_payloads)
+
+
 @app.route('/subdomains/<int:domain_id>', methods=['GET'])
 def get_subdomains(domain_id):
-    subdomains = subdomains_df[subdomains_df['domain_id'] == domain_id].to_dict(orient='records')
-    return jsonify(subdomains)
+    return subdomain_payloads.respond(domain_id)
 
 
 ##################### Recommend Courses ################
+def subdomain_recommendations(subdomain_id, top_n):
+    # The artifact is only valid for the catalog it was checked against at startup
+    if precomputed and recommendation_system.catalog_version == precomputed_catalog_version:
+        recommendation_system.refresh_if_changed()
+        if recommendation_system.catalog_version == precomputed_catalog_version:
+            precomputed_recs = precomputed.lookup('subdomain', subdomain_id, top_n)
+            cache_result('artifact', precomputed_recs is not None)
+            if precomputed_recs is not None and len(precomputed_recs[0]):
+                return recommendation_system.courses_df.iloc[precomputed_recs[0]]
+
+    return recommend_courses_by_subdomain(subdomain_id, top_n)
+
+
 @app.route('/recommend', methods=['GET'])
 def recommend():
     domain_id = int(request.args.get('domain_id'))
     subdomain_id = int(request.args.get('subdomain_id'))
     top_n = int(request.args.get('top_n', 6))
+    scope = request.args.get('scope')
 
-    recommended_courses = recommend_courses_by_subdomain(subdomain_id, top_n)
+    recommended_courses = recommendation_executor.result(cached_subdomain_recommendations(subdomain_id, top_n, scope))
     recommendations = recommended_courses.to_dict(orient='records')
 
     no_courses_message = None
     if len(recommendations) == 0:
         no_courses_message = "No courses match the selected domain and subdomain at this time."
 
+    subdomains_df = recommendation_system.subdomains_df
     return render_template(
         'domain.html',
-        domains=domain_df.to_dict(orient='records'),
+        domains=recommendation_system.domain_df.to_dict(orient='records'),
         subdomains=subdomains_df[subdomains_df['domain_id'] == domain_id].to_dict(orient='records'),
         recommendations=recommendations,
         selected_domain_id=domain_id,
         selected_subdomain_id=subdomain_id,
+        scope=scope,
         no_courses_message=no_courses_message
     )
 
 
+##################### Skill Gap ################
+skill_gap = (None, None)
+
+
+# Skill vocabulary and course bitsets, rebuilt when either catalog changes
+def skill_gap_index():
+    global skill_gap
+    recommendation_system.refresh_if_changed()
+    refresh_courses_if_changed()
+    version, index = skill_gap
+    if version != (courses_version, recommendation_system.catalog_version):
+        index = SkillGapIndex(courses_df, recommendation_system.subdomains_df)
+        skill_gap = ((courses_version, recommendation_system.catalog_version), index)
+    return index
+
+
+# Plan for the request's skills (comma-separated), job_role and optional subdomain_id
+def skill_gap_plan(args):
+    job_role = args.get('job_role')
+    if not job_role:
+        return None
+    subdomain_id = args.get('subdomain_id', type=int)
+    max_courses = args.get('max_courses', type=int)
+    return skill_gap_index().plan(split_skills(args.get('skills', '')), job_role, subdomain_id, max_courses)
+
+
+@app.route('/skillgap')
+def skillgap():
+    plan = skill_gap_plan(request.args)
+    return render_template(
+        'skillgap.html',
+        job_roles=courses_df['job_role'].unique(),
+        subdomains=recommendation_system.subdomains_df.to_dict(orient='records'),
+        plan=plan,
+        args=request.args,
+    )
+
+
+@app.route('/api/skillgap')
+def skillgap_api():
+    plan = skill_gap_plan(request.args)
+    if plan is None:
+        return jsonify({'error': 'job_role is required'}), 400
+    return jsonify(plan)
+
+
+##################### Course Search ################
+# One index per worker, brought up to date with the catalog by adding and
+# removing only the courses that changed
+course_search = SearchIndex()
+course_search_state = (None, {})
+
+
+# Catalog courses with their subdomain names in English and Malay, by course_id
+def course_search_records():
+    global course_search_state
+    recommendation_system.refresh_if_changed()
+    version, records = course_search_state
+    if version != recommendation_system.catalog_version:
+        subdomain_names = recommendation_system.subdomains_df[['subdomain_id', 'subdomain_name', 'subdomain_name_BM']]
+        catalog = recommendation_system.courses_df.merge(subdomain_names, on='subdomain_id', how='left')
+        catalog = catalog.astype(object).where(catalog.notna(), None)
+        records = {record['course_id']: record for record in catalog.to_dict(orient='records')}
+        course_search.sync(records)
+        course_search_state = (recommendation_system.catalog_version, records)
+    return records
+
+
+@app.route('/search')
+def search():
+    query = request.args.get('q', '')
+    top_n = min(request.args.get('top_n', 10, type=int), 100)
+    records = course_search_records()
+    results = [dict(records[course_id], score=score) for course_id, score in course_search.search(query, top_n)]
+    return jsonify({'query': query, 'results': results})
+
+
+@app.route('/search/suggest')
+def search_suggest():
+    course_search_records()
+    return jsonify(course_search.suggest(request.args.get('q', ''), min(request.args.get('limit', 10, type=int), 50)))
+
+
+##################### Catalog Matching ################
+# Catalog courses (any subdomain, or only subdomain_id) closest to a job
+# role's skills from courses.csv, matched in the catalog's embedding space
+@app.route('/api/job_roles/<job_role>/catalog_courses')
+def job_role_catalog_courses(job_role):
+    role_courses = courses_df[courses_df['job_role'] == job_role]
+    if role_courses.empty:
+        return jsonify([])
+    skills = ', '.join(role_courses['skills_required'].fillna('') + ', ' + role_courses['sub_skills_required'].fillna(''))
+
+    embeddings = recommendation_system.get_embeddings()
+    subdomain_id = request.args.get('subdomain_id', type=int)
+    mask = embeddings.subdomain_mask(subdomain_id) if subdomain_id is not None else None
+    rows, scores = embeddings.search(embeddings.project([skills])[0], min(request.args.get('top_n', 10, type=int), 100), mask)
+    courses = embeddings.courses_df.iloc[rows].to_dict(orient='records')
+    for course, score in zip(courses, scores):
+        course['similarity'] = float(score)
+    return jsonify(courses)
+
+
 ##################### Readme Route ################
 @app.route('/readme')
 def readme():
     with open('README.md', 'r') as readme_file:
         content = readme_file.read()
-        md = markdown.markdown(content)
+        md = lazy_import('markdown').markdown(content)
     return render_template('readme.html', content=Markup(md))
 
 
@@ -232,12 +765,13 @@ def data_visualization_2():
         year_range_max = int(request.form.get('year_range_max', 2024))
         selected_year_range = (year_range_min, year_range_max)
 
-    # Pass the year range to the create_visualization function
-    fig = create_visualization(selected_visualization, year_range=selected_year_range)
+    # Charts come from eda's pre-aggregated cube and are memoized per selection and year range
+    render_visualization = lazy_import('eda').render_visualization
+    plot = render_visualization(selected_visualization, year_range=selected_year_range)
 
     return render_template(
         'data_visualization_2.html',
-        plot=fig.to_html(full_html=False),
+        plot=plot,
         selected_visualization=selected_visualization,
         selected_year_range=selected_year_range
     )
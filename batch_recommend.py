@@ -0,0 +1,71 @@
+import numpy as np
+import scipy.sparse as sp
+
+
+# Queries scored together in one matrix-matrix product
+BATCH_CHUNK_SIZE = 512
+
+
+# Top-k columns of every row of a dense score matrix, best first.
+# Returns (indices, scores), both shaped (rows, k).
+def top_k_rows(scores, k):
+    n_rows, n_cols = scores.shape
+    k = min(k, n_cols)
+    if k <= 0:
+        return np.empty((n_rows, 0), dtype=np.intp), np.empty((n_rows, 0), dtype=scores.dtype)
+    if k < n_cols:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n_cols), (n_rows, n_cols))
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.lexsort((candidates, -candidate_scores), axis=1)
+    top = np.take_along_axis(candidates, order, axis=1)
+    return top, np.take_along_axis(scores, top, axis=1)
+
+
+# Content scores for many job roles at once: one (roles x terms) by
+# (terms x courses) sparse product. Unknown job roles get a row of NaN.
+def content_scores(content_index, job_roles):
+    known = [i for i, job_role in enumerate(job_roles) if content_index.query_vector(job_role) is not None]
+    scores = np.full((len(job_roles), len(content_index)), np.nan)
+    if known:
+        queries = sp.vstack([content_index.query_vector(job_roles[i]) for i in known])
+        scores[known] = (queries @ content_index.matrix_t).toarray()
+    return scores
+
+
+# Item-based CF predictions for many users at once: their rated-course rows
+# times the pruned course-course table. Already rated and unsupported courses
+# score -inf; unknown users get a row of NaN.
+def item_cf_scores(item_similarity, ratings_matrix, user_ids):
+    table = item_similarity.table()
+    n_courses = table.shape[0]
+    rows = [ratings_matrix.user_index.get(user_id) for user_id in user_ids]
+    known = [i for i, row in enumerate(rows) if row is not None]
+    scores = np.full((len(user_ids), n_courses), np.nan)
+    if not known:
+        return scores
+
+    user_ratings = ratings_matrix.matrix()[[rows[i] for i in known]][:, :n_courses]
+    rated_mask = (user_ratings != 0).astype(np.float64)
+    weighted_sum = (user_ratings @ table).toarray()
+    weight_total = (rated_mask @ table).toarray()
+    predicted = np.divide(weighted_sum, weight_total, out=np.full_like(weighted_sum, -np.inf), where=weight_total > 0)
+    predicted[rated_mask.toarray() > 0] = -np.inf
+    scores[known] = predicted
+    return scores
+
+
+# Ranked (course_id, score) lists for each row, skipping NaN rows and -inf scores.
+# nan_to_num would otherwise turn the -inf of rated courses into the lowest float.
+def ranked_lists(scores, course_ids, k):
+    indices, top_scores = top_k_rows(np.nan_to_num(scores, nan=-np.inf, neginf=-np.inf), k)
+    course_ids = np.asarray(course_ids)
+    results = []
+    for row_indices, row_scores in zip(indices, top_scores):
+        keep = np.isfinite(row_scores)
+        results.append([
+            {'course_id': course_id.item(), 'score': float(score)}
+            for course_id, score in zip(course_ids[row_indices[keep]], row_scores[keep])
+        ])
+    return results
@@ -0,0 +1,270 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Catalog, user and rating sizes each run is generated at
+SIZES = {
+    'small': {'courses': 100, 'catalog_courses': 1000, 'users': 200, 'ratings': 2000, 'wdata_rows': 1000},
+    'medium': {'courses': 1000, 'catalog_courses': 10000, 'users': 5000, 'ratings': 50000, 'wdata_rows': 100000},
+    'large': {'courses': 3000, 'catalog_courses': 50000, 'users': 50000, 'ratings': 1000000, 'wdata_rows': 1000000},
+}
+
+CASES = (
+    'content_based',
+    'collaborative_user',
+    'collaborative_item',
+    'subdomain',
+    'subdomain_cold',
+    'eda_visualization',
+)
+
+EDA_SELECTIONS = (
+    'year_distribution',
+    'duration_by_field',
+    'subfield_distribution',
+    'participant_scheme_distribution',
+    'trends_over_time',
+    'trends_schemes_over_time',
+)
+
+
+##################### Synthetic Workspace ################
+# A directory holding every CSV the app reads, resampled from the repo's own
+# data to the requested sizes so text and value distributions stay realistic
+def build_workspace(path, size, seed):
+    rng = np.random.default_rng(seed)
+
+    def resample(file_name, rows, **read_csv_kwargs):
+        source = pd.read_csv(os.path.join(REPO_DIR, file_name), **read_csv_kwargs)
+        return source.iloc[rng.integers(0, len(source), rows)].reset_index(drop=True)
+
+    courses = resample('courses.csv', size['courses'])
+    courses['course_id'] = np.arange(1, len(courses) + 1)
+    courses.to_csv(os.path.join(path, 'courses.csv'), index=False)
+
+    catalog = resample('Updated_Courses_with_Image_URLs.csv', size['catalog_courses'], encoding='latin1')
+    catalog['course_id'] = [f'BM{i:07d}' for i in range(len(catalog))]
+    catalog.to_csv(os.path.join(path, 'Updated_Courses_with_Image_URLs.csv'), index=False, encoding='latin1')
+
+    for file_name in ('subdomain_df.csv', 'domain_df.csv'):
+        shutil.copy(os.path.join(REPO_DIR, file_name), path)
+
+    # Users and courses are drawn with a skew so some are far more active than others
+    user_ids = rng.integers(10 ** 11, 10 ** 12, size['users'])
+    ratings = pd.DataFrame({
+        'user_id': user_ids[np.minimum(rng.zipf(1.3, size['ratings']) - 1, len(user_ids) - 1)],
+        'course_id': np.minimum(rng.zipf(1.2, size['ratings']), size['courses']),
+        'rating': rng.integers(1, 6, size['ratings']),
+        'timestamp': pd.Timestamp('2024-01-01') + pd.to_timedelta(np.sort(rng.integers(0, 365 * 86400, size['ratings'])), unit='s'),
+    })
+    ratings.to_csv(os.path.join(path, 'ratings.csv'), index=False)
+
+    wdata = resample('WData2.csv', size['wdata_rows'], encoding='latin1')
+    wdata['Kod_Kursus'] = [f'K{code:06d}' for code in rng.integers(0, size['catalog_courses'], len(wdata))]
+    for file_name in ('WData.csv', 'WData2.csv'):
+        wdata.to_csv(os.path.join(path, file_name), index=False, encoding='latin1')
+
+
+##################### Measuring ################
+# Wall time of repeat calls after warmup untimed passes over the same inputs,
+# then peak memory and allocated blocks of one more call
+def _measure(call, repeat, warmup):
+    for _ in range(warmup):
+        for i in range(repeat):
+            call(i)
+
+    times = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        call(i)
+        times.append(time.perf_counter() - started)
+
+    # Memory is traced on a separate call, since tracing slows everything down
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    baseline_memory = tracemalloc.get_traced_memory()[0]
+    call(repeat)
+    peak = tracemalloc.get_traced_memory()[1] - baseline_memory
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+
+    times.sort()
+    return {
+        'repeat': repeat,
+        'min_seconds': times[0],
+        'median_seconds': statistics.median(times),
+        'mean_seconds': statistics.fmean(times),
+        'p95_seconds': times[min(len(times) - 1, int(len(times) * 0.95))],
+        'peak_bytes': peak,
+        'allocated_blocks': blocks,
+    }
+
+
+def _cases(app, eda):
+    recommendation_system = app.recommendation_system
+    job_roles = app.courses_df['job_role'].unique()
+    user_ids = list(app.ratings_matrix.user_ids)
+    subdomain_ids = recommendation_system.subdomains_df['subdomain_id'].unique()
+
+    def subdomain_cold(i):
+        with recommendation_system._cache_lock:
+            recommendation_system._model_cache.clear()
+        recommendation_system.recommend_courses_by_subdomain(subdomain_ids[i % len(subdomain_ids)])
+
+    return {
+        'content_based': lambda i: app.content_based_recommendations(job_roles[i % len(job_roles)]),
+        'collaborative_user': lambda i: app.collaborative_filtering_recommendations(user_ids[i % len(user_ids)], 'user'),
+        'collaborative_item': lambda i: app.collaborative_filtering_recommendations(user_ids[i % len(user_ids)], 'item'),
+        'subdomain': lambda i: recommendation_system.recommend_courses_by_subdomain(subdomain_ids[i % len(subdomain_ids)]),
+        'subdomain_cold': subdomain_cold,
+        'eda_visualization': lambda i: eda.create_visualization(EDA_SELECTIONS[i % len(EDA_SELECTIONS)], (2021, 2023)),
+    }
+
+
+# Runs inside a fresh interpreter whose working directory is the workspace
+def run_worker(workspace, cases, repeat, warmup, result_file):
+    os.chdir(workspace)
+    os.environ['RATINGS_DB'] = os.path.join(workspace, 'ratings.db')
+    os.environ['DATA_CACHE_DIR'] = os.path.join(workspace, '.data_cache')
+    os.environ['RECS_ARTIFACT_DIR'] = os.path.join(workspace, 'artifacts')
+    sys.path.insert(0, REPO_DIR)
+
+    started = time.perf_counter()
+    import app
+    app_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    import eda
+    eda_seconds = time.perf_counter() - started
+
+    callables = _cases(app, eda)
+    results = {'setup': {'app_import_seconds': app_seconds, 'eda_import_seconds': eda_seconds}, 'cases': {}}
+    for name in cases:
+        results['cases'][name] = _measure(callables[name], repeat, warmup)
+
+    with open(result_file, 'w') as out:
+        json.dump(results, out)
+
+
+def run_size(name, size, cases, repeat, warmup, seed, keep):
+    workspace = tempfile.mkdtemp(prefix=f'bench-{name}-')
+    try:
+        started = time.perf_counter()
+        build_workspace(workspace, size, seed)
+        generate_seconds = time.perf_counter() - started
+
+        result_file = os.path.join(workspace, 'result.json')
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', workspace, '--result-file', result_file,
+             '--repeat', str(repeat), '--warmup', str(warmup), '--cases', *cases],
+            check=True,
+        )
+        with open(result_file) as result:
+            results = json.load(result)
+    finally:
+        if keep:
+            print(f"Workspace kept at {workspace}")
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    results['setup']['generate_seconds'] = generate_seconds
+    return {'size': name, 'params': size, **results}
+
+
+##################### Comparing ################
+# (size, case, metric, baseline, current, ratio) for every metric that got
+# worse by more than threshold
+def compare(baseline, current, threshold):
+    regressions = []
+    previous_runs = {run['size']: run for run in baseline['runs']}
+    for run in current['runs']:
+        previous = previous_runs.get(run['size'])
+        if previous is None or previous['params'] != run['params']:
+            continue
+        for case, result in run['cases'].items():
+            before = previous['cases'].get(case)
+            if before is None:
+                continue
+            for metric in ('median_seconds', 'peak_bytes'):
+                if before[metric] > 0:
+                    ratio = result[metric] / before[metric]
+                    if ratio > 1 + threshold:
+                        regressions.append((run['size'], case, metric, before[metric], result[metric], ratio))
+    return regressions
+
+
+def format_results(results):
+    lines = [f"{'size':<8} {'case':<20} {'median ms':>10} {'p95 ms':>10} {'peak MiB':>10} {'blocks':>10}"]
+    for run in results['runs']:
+        for case, result in run['cases'].items():
+            lines.append(
+                f"{run['size']:<8} {case:<20} {result['median_seconds'] * 1000:>10.2f} {result['p95_seconds'] * 1000:>10.2f} "
+                f"{result['peak_bytes'] / 2 ** 20:>10.2f} {result['allocated_blocks']:>10}"
+            )
+        setup = run['setup']
+        lines.append(f"{run['size']:<8} {'(app import)':<20} {setup['app_import_seconds'] * 1000:>10.0f}")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the recommenders at generated catalog, user and rating sizes.')
+    parser.add_argument('--sizes', nargs='+', default=['small'], help=f"presets to run: {', '.join(SIZES)}, or 'custom'")
+    for param, value in SIZES['small'].items():
+        parser.add_argument(f"--{param.replace('_', '-')}", type=int, default=value, help='size used by --sizes custom')
+    parser.add_argument('--cases', nargs='+', default=list(CASES), choices=CASES)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=1, help='untimed passes before timing')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--baseline', help='compare against results saved with --output')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown or memory growth (0.2 = 20%%)')
+    parser.add_argument('--keep', action='store_true', help='keep the generated workspaces')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.cases, args.repeat, args.warmup, args.result_file)
+        sys.exit(0)
+
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'seed': args.seed,
+        'runs': [],
+    }
+    for name in args.sizes:
+        size = {param: getattr(args, param) for param in SIZES['small']} if name == 'custom' else SIZES[name]
+        print(f"Running {name} {size}", flush=True)
+        results['runs'].append(run_size(name, size, args.cases, args.repeat, args.warmup, args.seed, args.keep))
+
+    print(format_results(results))
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(results, out, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(json.load(baseline_file), results, args.threshold)
+        for size, case, metric, before, after, ratio in regressions:
+            print(f"REGRESSION {size} {case} {metric}: {before:.6g} -> {after:.6g} ({ratio:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}.")
@@ -0,0 +1,71 @@
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from metrics import stage, inc, cache_result
+
+
+# Prebuilt TF-IDF index over the course catalog.
+#
+# The vectorizer is fitted once per catalog and the resulting matrix is kept
+# L2-normalized and sparse, so the cosine similarity between a query and every
+# course is a single sparse row-times-matrix product. Nothing quadratic in the
+# number of courses is ever materialized.
+class ContentIndex:
+    def __init__(self, courses_df):
+        self.courses_df = courses_df
+        self.vectorizer = TfidfVectorizer()
+        text = courses_df['skills_required'].fillna('') + ' ' + courses_df['sub_skills_required'].fillna('')
+        with stage('tfidf_fit'):
+            self.matrix = self.vectorizer.fit_transform(text).tocsr()
+            self.matrix_t = self.matrix.T.tocsr()
+        inc('model_rebuilds_total', model='content_index')
+
+        # A job role is queried with the vector of its first course in the catalog
+        self._first_row = {}
+        for row, job_role in enumerate(courses_df['job_role']):
+            self._first_row.setdefault(job_role, row)
+        self._query_cache = {}
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def query_vector(self, job_role):
+        vec = self._query_cache.get(job_role)
+        cache_result('query_vector', vec is not None)
+        if vec is None:
+            row = self._first_row.get(job_role)
+            if row is None:
+                return None
+            vec = self.matrix[row]
+            self._query_cache[job_role] = vec
+        return vec
+
+    def scores(self, job_role):
+        vec = self.query_vector(job_role)
+        if vec is None:
+            return None
+        with stage('similarity'):
+            return np.asarray((vec @ self.matrix_t).todense()).ravel()
+
+    def top_k(self, job_role, k=10):
+        scores = self.scores(job_role)
+        if scores is None:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        return top_k_indices(scores, k)
+
+
+# Indices of the k largest scores, best first. Ties keep catalog order.
+def top_k_indices(scores, k):
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=scores.dtype)
+    if k < n:
+        kth = scores[np.argpartition(scores, n - k)[n - k]]
+        above = np.flatnonzero(scores > kth)
+        tied = np.flatnonzero(scores == kth)[:k - len(above)]
+        candidates = np.concatenate([above, tied])
+    else:
+        candidates = np.arange(n)
+    order = np.lexsort((candidates, -scores[candidates]))
+    top = candidates[order]
+    return top, scores[top]
@@ -0,0 +1,113 @@
+import hashlib
+import os
+import threading
+
+from metrics import cache_result
+
+
+DASHBOARD_CACHE_DIR = os.environ.get('DASHBOARD_CACHE_DIR', '.dashboard_cache')
+
+
+def _sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Generated dashboard HTML cached in memory and on disk.
+#
+# Entries are keyed by the source dataset's content hash (re-hashed only when
+# its mtime or size changes). The first build for a dataset happens on the
+# request that needs it; after that, a change to the dataset keeps serving the
+# previous HTML while a background thread builds the new one. Disk copies are
+# shared by all worker processes.
+class DashboardCache:
+    def __init__(self, name, source_path, build_html):
+        self.name = name
+        self.source_path = source_path
+        self.build_html = build_html
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._signature = None
+        self._source_sha1 = None
+        self._entry = None
+        self._rebuilding = None
+
+    def _current_sha1(self):
+        stat = os.stat(self.source_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature != self._signature:
+            self._source_sha1 = _sha1(self.source_path)
+            self._signature = signature
+        return self._source_sha1
+
+    def _disk_path(self, source_sha1):
+        return os.path.join(DASHBOARD_CACHE_DIR, f'{self.name}-{source_sha1}.html')
+
+    def _entry_for(self, source_sha1, html):
+        etag = hashlib.sha1(html.encode('utf-8')).hexdigest()[:20]
+        return {'source_sha1': source_sha1, 'etag': etag, 'html': html}
+
+    def _load_from_disk(self, source_sha1):
+        try:
+            with open(self._disk_path(source_sha1), encoding='utf-8') as cached:
+                return self._entry_for(source_sha1, cached.read())
+        except OSError:
+            return None
+
+    def _build(self, source_sha1):
+        with self._build_lock:
+            entry = self._load_from_disk(source_sha1)
+            if entry is None:
+                entry = self._entry_for(source_sha1, self.build_html())
+                os.makedirs(DASHBOARD_CACHE_DIR, exist_ok=True)
+                path = self._disk_path(source_sha1)
+                tmp = f'{path}.{os.getpid()}.tmp'
+                with open(tmp, 'w', encoding='utf-8') as cached:
+                    cached.write(entry['html'])
+                os.replace(tmp, path)
+                self._remove_stale(source_sha1)
+            with self._lock:
+                self._entry = entry
+                self._rebuilding = None
+            return entry
+
+    def _remove_stale(self, source_sha1):
+        keep = os.path.basename(self._disk_path(source_sha1))
+        for file_name in os.listdir(DASHBOARD_CACHE_DIR):
+            if file_name.startswith(f'{self.name}-') and file_name.endswith('.html') and file_name != keep:
+                try:
+                    os.remove(os.path.join(DASHBOARD_CACHE_DIR, file_name))
+                except OSError:
+                    pass
+
+    def _rebuild_in_background(self, source_sha1):
+        with self._lock:
+            if self._rebuilding == source_sha1:
+                return
+            self._rebuilding = source_sha1
+        threading.Thread(target=self._build, args=(source_sha1,), name=f'{self.name}-rebuild', daemon=True).start()
+
+    # Current entry as {'etag', 'html', 'source_sha1'}; may be the previous
+    # dataset's entry while a rebuild is running
+    def get(self):
+        source_sha1 = self._current_sha1()
+        with self._lock:
+            entry = self._entry
+        if entry is not None and entry['source_sha1'] == source_sha1:
+            cache_result(f'dashboard_{self.name}', True)
+            return entry
+        cache_result(f'dashboard_{self.name}', False)
+
+        disk_entry = self._load_from_disk(source_sha1)
+        if disk_entry is not None:
+            with self._lock:
+                self._entry = disk_entry
+            return disk_entry
+
+        if entry is not None:
+            self._rebuild_in_background(source_sha1)
+            return entry
+        return self._build(source_sha1)
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import threading
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+
+# Converted copies of the source CSVs, shared by every worker process
+DATA_CACHE_DIR = os.environ.get('DATA_CACHE_DIR', '.data_cache')
+
+# Every CSV the app reads, with the options it is parsed with
+SOURCES = {
+    'courses.csv': {},
+    'WData.csv': {'encoding': 'latin1'},
+    'WData2.csv': {'encoding': 'latin1'},
+    'domain_df.csv': {'encoding': 'latin1'},
+    'subdomain_df.csv': {'encoding': 'latin1'},
+    'Updated_Courses_with_Image_URLs.csv': {'encoding': 'latin1'},
+}
+
+_frames = {}
+_lock = threading.Lock()
+
+
+def _sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_paths(path, read_csv_kwargs):
+    options = hashlib.sha1(json.dumps(read_csv_kwargs, sort_keys=True).encode()).hexdigest()[:8]
+    stem = os.path.basename(path).rsplit('.', 1)[0]
+    base = os.path.join(DATA_CACHE_DIR, f'{stem}-{options}')
+    return base + '.parquet', base + '.json'
+
+
+def _write_atomic(path, write):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _write_json(path, data):
+    with open(path, 'w') as json_file:
+        json.dump(data, json_file)
+
+
+def _load_converted(path, read_csv_kwargs, stat):
+    parquet_path, manifest_path = _cache_paths(path, read_csv_kwargs)
+    try:
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        manifest = {}
+
+    # Unchanged size and mtime: trust the converted copy without hashing
+    if manifest.get('mtime_ns') == stat.st_mtime_ns and manifest.get('size') == stat.st_size and os.path.exists(parquet_path):
+        return pd.read_parquet(parquet_path)
+
+    sha1 = _sha1(path)
+    if manifest.get('sha1') == sha1 and os.path.exists(parquet_path):
+        frame = pd.read_parquet(parquet_path)
+    else:
+        frame = pd.read_csv(path, **read_csv_kwargs)
+        os.makedirs(DATA_CACHE_DIR, exist_ok=True)
+        _write_atomic(parquet_path, lambda tmp: frame.to_parquet(tmp, index=False))
+
+    manifest = {'source': path, 'sha1': sha1, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+    _write_atomic(manifest_path, lambda tmp: _write_json(tmp, manifest))
+    return frame
+
+
+# Load a source CSV through its typed columnar copy.
+#
+# The CSV is parsed only when its content hash differs from the one the
+# Parquet copy was converted from; otherwise the Parquet file is read. Frames
+# are shared within a process until the source changes, so callers must treat
+# them as read-only. Without pyarrow the CSV is parsed directly.
+def load_csv(path, **read_csv_kwargs):
+    if not read_csv_kwargs:
+        read_csv_kwargs = dict(SOURCES.get(path, {}))
+    stat = os.stat(path)
+    key = (path, json.dumps(read_csv_kwargs, sort_keys=True))
+
+    with _lock:
+        cached = _frames.get(key)
+        if cached is not None and cached[0] == (stat.st_mtime_ns, stat.st_size):
+            return cached[1]
+
+        if HAS_PARQUET:
+            frame = _load_converted(path, read_csv_kwargs, stat)
+        else:
+            frame = pd.read_csv(path, **read_csv_kwargs)
+        _frames[key] = ((stat.st_mtime_ns, stat.st_size), frame)
+        return frame
+
+
+if __name__ == '__main__':
+    # Convert every source ahead of time, e.g. during a deploy
+    for source in SOURCES:
+        if os.path.exists(source):
+            frame = load_csv(source)
+            print(f"{source}: {len(frame)} rows")
+        else:
+            print(f"{source}: not found, skipped")
@@ -1,21 +1,150 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
 import plotly.express as px
 import pandas as pd
+from plotly.offline import get_plotlyjs
+from data_loader import load_csv
+from metrics import cache_result
 
 # Load the dataset
-df = pd.read_csv('WData.csv', encoding='latin1')
+df = load_csv('WData.csv')
+
+# Rendered charts kept per (selection, year_range)
+FIGURE_CACHE_SIZE = int(os.environ.get('FIGURE_CACHE_SIZE', 256))
+
+
+##################### Aggregate Cube ################
+# Enrollment counts of every course per year, grouped by some of the
+# dimensions (Bidang, Sub_Bidang, Nama_Skim).
+#
+# Distinct course counts do not add up across groups or years, so the cube
+# keeps one row per (dimensions..., Kod_Kursus) and accumulates its counts over
+# the years. The enrollments in a year range are then the difference of two
+# cumulative columns, and a course counts towards its group when it has any.
+# Rows are sorted by group, so groups are contiguous.
+class AggregateCube:
+    def __init__(self, frame, dims=(), duration=False):
+        keys = list(dims) + ['Kod_Kursus']
+        grouped = frame.groupby(keys + ['Tahun_Kursus'])
+        # Rows without a year only count when no year range is selected
+        totals = frame.groupby(keys).size()
+        per_year = grouped.size().unstack('Tahun_Kursus', fill_value=0).reindex(totals.index, fill_value=0)
+
+        self.years = per_year.columns.to_numpy()
+        self.counts = per_year.to_numpy()
+        self.cumulative = self._accumulate(self.counts)
+        self.totals = totals.to_numpy()
+
+        if dims:
+            groups = per_year.index.droplevel('Kod_Kursus')
+            self.codes, self.groups = pd.factorize(groups)
+            self.groups = self.groups.set_names(groups.names)
+        else:
+            self.codes = np.zeros(len(per_year), dtype=np.intp)
+            self.groups = None
+        n_groups = len(self.groups) if dims else 1
+
+        # Distinct courses per group and year
+        self.distinct_per_year = np.zeros((n_groups, len(self.years)), dtype=np.int64)
+        np.add.at(self.distinct_per_year, self.codes, self.counts > 0)
+
+        # Sum and count of known durations, for average durations
+        self.duration = None
+        if duration:
+            sums = grouped['Tempoh_Kursus'].sum().unstack('Tahun_Kursus', fill_value=0)
+            known = grouped['Tempoh_Kursus'].count().unstack('Tahun_Kursus', fill_value=0)
+            total = frame.groupby(keys)['Tempoh_Kursus'].agg(['sum', 'count'])
+            self.duration = (
+                self._accumulate(sums.reindex(index=totals.index, columns=per_year.columns, fill_value=0).to_numpy(dtype=np.float64)),
+                self._accumulate(known.reindex(index=totals.index, columns=per_year.columns, fill_value=0).to_numpy()),
+                total['sum'].to_numpy(dtype=np.float64),
+                total['count'].to_numpy(),
+            )
+
+    @staticmethod
+    def _accumulate(values):
+        cumulative = np.zeros((values.shape[0], values.shape[1] + 1), dtype=values.dtype)
+        np.cumsum(values, axis=1, out=cumulative[:, 1:])
+        return cumulative
+
+    # Column bounds of the years inside year_range (inclusive), or None for all rows
+    def _window(self, year_range):
+        if not year_range:
+            return None
+        low = int(np.searchsorted(self.years, year_range[0], side='left'))
+        high = max(int(np.searchsorted(self.years, year_range[1], side='right')), low)
+        return low, high
+
+    def _in_range(self, cumulative, totals, window):
+        if window is None:
+            return totals
+        low, high = window
+        return cumulative[:, high] - cumulative[:, low]
+
+    def _frame(self, values, name):
+        keep = values > 0
+        frame = self.groups[keep].to_frame(index=False)
+        frame[name] = values[keep]
+        return frame
+
+    # Years in range with their distinct course count, one entry per course
+    def course_years(self, year_range=None):
+        low, high = self._window(year_range) or (0, len(self.years))
+        return np.repeat(self.years[low:high], self.distinct_per_year[0, low:high])
+
+    # Distinct courses per (year, group) with at least one course
+    def distinct_by_year(self, year_range, name):
+        low, high = self._window(year_range) or (0, len(self.years))
+        table = pd.DataFrame(
+            self.distinct_per_year[:, low:high],
+            index=self.groups,
+            columns=pd.Index(self.years[low:high], name='Tahun_Kursus'),
+        )
+        stacked = table.T.stack()
+        return stacked[stacked > 0].reset_index(name=name)
+
+    # Distinct courses per group over the whole year range
+    def distinct(self, year_range, name):
+        present = self._in_range(self.cumulative, self.totals, self._window(year_range)) > 0
+        counts = np.bincount(self.codes, weights=present, minlength=len(self.groups)).astype(np.int64)
+        return self._frame(counts, name)
+
+    # Per group, the mean over its courses of each course's mean duration
+    def average_duration(self, year_range, name):
+        window = self._window(year_range)
+        sums, known, total_sums, total_known = self.duration
+        present = self._in_range(self.cumulative, self.totals, window) > 0
+        duration_sum = self._in_range(sums, total_sums, window)
+        duration_known = self._in_range(known, total_known, window)
+
+        valid = present & (duration_known > 0)
+        course_means = np.divide(duration_sum, duration_known, out=np.zeros(len(valid)), where=valid)
+        n_groups = len(self.groups)
+        mean_sum = np.bincount(self.codes, weights=course_means, minlength=n_groups)
+        n_valid = np.bincount(self.codes, weights=valid, minlength=n_groups)
+        means = np.divide(mean_sum, n_valid, out=np.full(n_groups, np.nan), where=n_valid > 0)
+
+        keep = np.bincount(self.codes, weights=present, minlength=n_groups) > 0
+        frame = self.groups[keep].to_frame(index=False)
+        frame[name] = means[keep]
+        return frame
+
+
+# Built once at load time; every chart is answered from these
+course_cube = AggregateCube(df)
+field_cube = AggregateCube(df, ['Bidang'], duration=True)
+subfield_cube = AggregateCube(df, ['Bidang', 'Sub_Bidang'])
+scheme_cube = AggregateCube(df, ['Nama_Skim'])
 
 
 # Create a function that generates the desired visualization based on the selected chart and year range
 def create_visualization(selection, year_range=None):
-    # Filter the dataset by the selected year range, if provided
-    if year_range:
-        filtered_df = df[(df['Tahun_Kursus'] >= year_range[0]) & (df['Tahun_Kursus'] <= year_range[1])]
-    else:
-        filtered_df = df
-
     if selection == 'year_distribution':
-        # Group by 'Tahun_Kursus' and 'Kod_Kursus' to ensure unique course count
-        grouped_courses = filtered_df.groupby(['Tahun_Kursus', 'Kod_Kursus']).size().reset_index(name='Course Count')
+        # One row per unique (year, course) pair
+        grouped_courses = pd.DataFrame({'Tahun_Kursus': course_cube.course_years(year_range)})
         
         # Histogram: Course Distribution by Year
         fig = px.histogram(
@@ -41,9 +170,8 @@ def create_visualization(selection, year_range=None):
         )
 
     elif selection == 'duration_by_field':
-        # Group by 'Bidang' and 'Kod_Kursus' to calculate average duration per course
-        df_avg_duration = filtered_df.groupby(['Bidang', 'Kod_Kursus'])['Tempoh_Kursus'].mean().reset_index()
-        df_avg_duration = df_avg_duration.groupby('Bidang')['Tempoh_Kursus'].mean().reset_index()
+        # Average duration per course, then averaged per field
+        df_avg_duration = field_cube.average_duration(year_range, 'Tempoh_Kursus')
         
         # Bar Chart: Average Course Duration by Field
         fig = px.bar(
@@ -66,11 +194,8 @@ def create_visualization(selection, year_range=None):
         )
 
     elif selection == 'subfield_distribution':
-        # Group by 'Bidang', 'Sub_Bidang', and 'Kod_Kursus' to ensure unique course count
-        df_filtered = filtered_df.dropna(subset=['Sub_Bidang']).groupby(['Bidang', 'Sub_Bidang', 'Kod_Kursus']).size().reset_index(name='Course Count')
-        
-        # Now, count unique 'Kod_Kursus' per 'Bidang' and 'Sub_Bidang'
-        subfield_counts = df_filtered.groupby(['Bidang', 'Sub_Bidang'])['Kod_Kursus'].nunique().reset_index(name='Course Count')
+        # Count unique 'Kod_Kursus' per 'Bidang' and 'Sub_Bidang'
+        subfield_counts = subfield_cube.distinct(year_range, 'Course Count')
         
         # Treemap: Courses by Sub-Field
         fig = px.treemap(
@@ -89,9 +214,8 @@ def create_visualization(selection, year_range=None):
         )
 
     elif selection == 'participant_scheme_distribution':
-        # Group by 'Nama_Skim' and 'Kod_Kursus' to ensure unique course count
-        df_scheme = filtered_df.groupby(['Nama_Skim', 'Kod_Kursus']).size().reset_index(name='Count')
-        scheme_counts = df_scheme.groupby('Nama_Skim')['Kod_Kursus'].nunique().reset_index(name='Number of Participants')
+        # Count unique 'Kod_Kursus' per 'Nama_Skim'
+        scheme_counts = scheme_cube.distinct(year_range, 'Number of Participants')
         
         # Pie Chart: Participant Scheme Distribution
         fig = px.pie(
@@ -114,9 +238,8 @@ def create_visualization(selection, year_range=None):
         )
 
     elif selection == 'trends_over_time':
-        # Group by 'Tahun_Kursus', 'Bidang', and 'Kod_Kursus' to ensure unique course count
-        grouped = filtered_df.groupby(['Tahun_Kursus', 'Bidang', 'Kod_Kursus']).size().reset_index(name='Course Count')
-        trends = grouped.groupby(['Tahun_Kursus', 'Bidang'])['Kod_Kursus'].nunique().reset_index(name='Course Count')
+        # Count unique 'Kod_Kursus' per 'Tahun_Kursus' and 'Bidang'
+        trends = field_cube.distinct_by_year(year_range, 'Course Count')
         
         # Line Chart: Trends Over Time
         fig = px.line(
@@ -137,9 +260,8 @@ def create_visualization(selection, year_range=None):
         )
 
     elif selection == 'trends_schemes_over_time':
-        # Group by 'Tahun_Kursus', 'Nama_Skim', and 'Kod_Kursus' to ensure unique course count
-        grouped_schemes = filtered_df.groupby(['Tahun_Kursus', 'Nama_Skim', 'Kod_Kursus']).size().reset_index(name='Participant Count')
-        trends_schemes = grouped_schemes.groupby(['Tahun_Kursus', 'Nama_Skim'])['Kod_Kursus'].nunique().reset_index(name='Participant Count')
+        # Count unique 'Kod_Kursus' per 'Tahun_Kursus' and 'Nama_Skim'
+        trends_schemes = scheme_cube.distinct_by_year(year_range, 'Participant Count')
     
         # Bubble chart: Trends in Participant Schemes Over Time
         fig = px.scatter(
@@ -167,3 +289,40 @@ def create_visualization(selection, year_range=None):
         )
     
     return fig
+
+
+##################### Rendered Charts ################
+_figure_cache = OrderedDict()
+_figure_lock = threading.Lock()
+_plotlyjs_html = None
+
+
+def _plotlyjs():
+    global _plotlyjs_html
+    if _plotlyjs_html is None:
+        _plotlyjs_html = (
+            '<script type="text/javascript">window.PlotlyConfig = {MathJaxConfig: \'local\'};</script>\n'
+            f'<script charset="utf-8" type="text/javascript">{get_plotlyjs()}</script>'
+        )
+    return _plotlyjs_html
+
+
+# Chart markup for a page, memoized per (selection, year_range). Only the
+# figure's div (which carries its JSON) is cached; plotly.js is embedded from
+# one copy per process.
+def render_visualization(selection, year_range=None):
+    key = (selection, tuple(year_range) if year_range else None)
+    with _figure_lock:
+        chart = _figure_cache.get(key)
+        if chart is not None:
+            _figure_cache.move_to_end(key)
+    cache_result('eda_figure', chart is not None)
+
+    if chart is None:
+        fig = create_visualization(selection, year_range)
+        chart = fig.to_html(full_html=False, include_plotlyjs=False)
+        with _figure_lock:
+            _figure_cache[key] = chart
+            while len(_figure_cache) > FIGURE_CACHE_SIZE:
+                _figure_cache.popitem(last=False)
+    return _plotlyjs() + chart
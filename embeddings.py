@@ -0,0 +1,110 @@
+import os
+
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from content_index import top_k_indices
+from metrics import inc, stage
+
+
+# Dimensions of the LSA space
+EMBEDDING_DIM = int(os.environ.get('EMBEDDING_DIM', 128))
+
+# Storage for course vectors: 'float32', or 'int8' for a quarter of the memory
+EMBEDDING_DTYPE = os.environ.get('EMBEDDING_DTYPE', 'float32')
+
+# Rows of an int8 matrix dequantized at a time while scoring
+INT8_BLOCK_ROWS = 8192
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+# English title and description; the descriptions share a template, so the
+# title carries most of what tells courses apart
+def course_text(courses_df):
+    text = courses_df['course_description'].fillna('')
+    if 'course_title_english' in courses_df:
+        text = courses_df['course_title_english'].fillna('') + '. ' + text
+    return text
+
+
+# Dense LSA embeddings of every course in the catalog.
+#
+# TruncatedSVD over the TF-IDF of course titles and descriptions gives each
+# course a unit vector of dim floats. Subdomain skill strings are projected
+# into the same space when the catalog is built, and any other text (a job
+# role's skills, a free-text query) through project(), so matching a query
+# against the whole catalog is one matrix-vector product instead of a refit
+# per subdomain. With dtype='int8', vectors are stored as int8 with one scale per
+# row and dequantized block by block while scoring.
+class CourseEmbeddings:
+    def __init__(self, courses_df, subdomains_df=None, dim=EMBEDDING_DIM, dtype=EMBEDDING_DTYPE):
+        self.courses_df = courses_df
+        self.vectorizer = TfidfVectorizer(stop_words='english', sublinear_tf=True)
+        with stage('tfidf_fit'):
+            tfidf = self.vectorizer.fit_transform(course_text(courses_df))
+        dim = max(1, min(dim, tfidf.shape[1] - 1, tfidf.shape[0] - 1))
+        self.svd = TruncatedSVD(n_components=dim, random_state=42)
+        with stage('svd_fit'):
+            vectors = _normalize(self.svd.fit_transform(tfidf)).astype(np.float32)
+
+        self.dtype = dtype
+        if dtype == 'int8':
+            self.scales = np.abs(vectors).max(axis=1) / 127
+            self.scales[self.scales == 0] = 1
+            self.vectors = np.round(vectors / self.scales[:, None]).astype(np.int8)
+            self.scales = self.scales.astype(np.float32)
+        else:
+            self.scales = None
+            self.vectors = vectors
+
+        self.subdomain_ids = courses_df['subdomain_id'].to_numpy() if 'subdomain_id' in courses_df else None
+        self.subdomain_vectors = {}
+        if subdomains_df is not None:
+            projected = self.project(subdomains_df['skills'].fillna('').tolist())
+            self.subdomain_vectors = dict(zip(subdomains_df['subdomain_id'], projected))
+        inc('model_rebuilds_total', model='course_embeddings')
+
+    def __len__(self):
+        return len(self.vectors)
+
+    # Unit vectors for a list of texts, in the course space
+    def project(self, texts):
+        with stage('tfidf_transform'):
+            tfidf = self.vectorizer.transform(texts)
+        return _normalize(self.svd.transform(tfidf)).astype(np.float32)
+
+    # Cosine similarity of every course to a unit query vector
+    def scores(self, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        with stage('similarity'):
+            if self.scales is None:
+                return self.vectors @ vector
+            scores = np.empty(len(self.vectors), dtype=np.float32)
+            for start in range(0, len(self.vectors), INT8_BLOCK_ROWS):
+                block = self.vectors[start:start + INT8_BLOCK_ROWS]
+                scores[start:start + len(block)] = block.astype(np.float32) @ vector
+            return scores * self.scales
+
+    # Best courses for a query vector as (row indices into courses_df, similarities),
+    # over the whole catalog or only the courses where mask is True
+    def search(self, vector, top_n=10, mask=None):
+        scores = self.scores(vector)
+        candidates = np.flatnonzero(mask) if mask is not None else np.arange(len(scores))
+        top, top_scores = top_k_indices(scores[candidates], top_n)
+        return candidates[top], top_scores
+
+    def subdomain_mask(self, subdomain_id):
+        return self.subdomain_ids == subdomain_id
+
+    # Courses closest to a subdomain's skills, across subdomains unless one is given as mask
+    def for_subdomain(self, subdomain_id, top_n=10, mask=None):
+        vector = self.subdomain_vectors.get(subdomain_id)
+        if vector is None:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+        return self.search(vector, top_n, mask)
@@ -0,0 +1,134 @@
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import inc
+
+
+# Processes scoring recommendations off the request thread; 0 scores inline
+EXECUTOR_WORKERS = int(os.environ.get('EXECUTOR_WORKERS', 0))
+
+# Tasks queued or running at once before new ones are refused
+EXECUTOR_QUEUE_SIZE = int(os.environ.get('EXECUTOR_QUEUE_SIZE', 64))
+
+# Seconds a request waits for its task
+EXECUTOR_TIMEOUT = float(os.environ.get('EXECUTOR_TIMEOUT', 10))
+
+# Set in pool processes so importing the app there does not start another pool
+CHILD_ENV = 'RECS_EXECUTOR_CHILD'
+
+
+class Saturated(Exception):
+    pass
+
+
+##################### Pool Processes ################
+_module = None
+
+
+def _init_worker(module_name):
+    global _module
+    os.environ[CHILD_ENV] = '1'
+    # Started with `python app.py`, the pool process has already run app.py as
+    # __mp_main__; reuse it rather than loading the models a second time
+    main = sys.modules.get('__mp_main__')
+    if main is not None and os.path.splitext(os.path.basename(getattr(main, '__file__', None) or ''))[0] == module_name:
+        sys.modules[module_name] = main
+    import importlib
+    _module = importlib.import_module(module_name)
+
+
+def _call(name, args):
+    return getattr(_module, name)(*args)
+
+
+def _ready():
+    return os.getpid()
+
+
+# Runs CPU-heavy recommendation functions in a warm process pool.
+#
+# Each pool process imports the app module once (loading its catalog, index
+# and ratings models) and then serves calls by function name, so only
+# arguments and small results cross the process boundary. At most
+# queue_size tasks are queued or running; submit() raises Saturated beyond
+# that, and callers wait at most timeout seconds for a result. With no
+# workers, tasks run inline on the calling thread.
+class RecommendationExecutor:
+    def __init__(self, module_name, workers=EXECUTOR_WORKERS, queue_size=EXECUTOR_QUEUE_SIZE, timeout=EXECUTOR_TIMEOUT):
+        self.module_name = module_name
+        self.workers = workers if os.environ.get(CHILD_ENV) != '1' else 0
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._started = False
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self.module_name,),
+                )
+            return self._pool
+
+    # Start every pool process now, so the first requests do not pay for loading models
+    def start(self):
+        if self.workers and not self._started:
+            self._started = True
+            pool = self._get_pool()
+            for _ in range(self.workers):
+                pool.submit(_ready)
+
+    def submit(self, fn, *args):
+        if not self.workers:
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        if not self._slots.acquire(blocking=False):
+            inc('executor_rejected_total')
+            raise Saturated(f'{fn.__name__}: executor queue is full')
+        try:
+            future = self._get_pool().submit(_call, fn.__name__, args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._reset()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    # Result of a submitted task; raises TimeoutError after timeout seconds.
+    # The task itself keeps its slot until it finishes.
+    def result(self, future):
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            inc('executor_timeouts_total')
+            raise
+        except BrokenProcessPool:
+            self._reset()
+            raise
+
+    # A pool process died; later tasks get a new pool
+    def _reset(self):
+        with self._lock:
+            self._pool = None
+
+    def run(self, fn, *args):
+        return self.result(self.submit(fn, *args))
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,156 @@
+import argparse
+import gzip
+import hashlib
+import os
+import threading
+
+from flask import request, Response
+
+from metrics import inc
+
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    HAS_BROTLI = False
+
+
+# How long browsers may reuse a catalog response before revalidating it
+CATALOG_MAX_AGE = int(os.environ.get('CATALOG_MAX_AGE', 300))
+
+# Static files are requested with ?v=<content hash>, so they can be cached for a year
+STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 365 * 24 * 3600))
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 512
+
+
+def _etag(body):
+    return hashlib.sha1(body).hexdigest()[:20]
+
+
+# One prebuilt response body with its compressed forms and strong ETags
+class Payload:
+    def __init__(self, body):
+        self.variants = {'identity': (body, _etag(body))}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.variants['gzip'] = (compressed, self.variants['identity'][1] + '-gz')
+            if HAS_BROTLI:
+                compressed = brotli.compress(body)
+                if len(compressed) < len(body):
+                    self.variants['br'] = (compressed, self.variants['identity'][1] + '-br')
+
+    def _encoding(self):
+        accepted = request.accept_encodings
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and accepted[encoding] > 0:
+                return encoding
+        return 'identity'
+
+    def response(self, mimetype, max_age):
+        encoding = self._encoding()
+        body, etag = self.variants[encoding]
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype=mimetype)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = f'public, max-age={max_age}'
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+# Prebuilt responses for every key of an endpoint whose data only changes with
+# the catalog.
+#
+# build() returns {key: body bytes} for the whole catalog and is called again
+# only when version() changes; keys it does not return are answered with
+# missing. Requests then only pick an encoding and compare ETags.
+class PayloadCache:
+    def __init__(self, version, build, mimetype='application/json', missing=b'[]\n', max_age=CATALOG_MAX_AGE):
+        self.version = version
+        self.build = build
+        self.mimetype = mimetype
+        self.missing = missing
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._built_version = None
+        self._payloads = {}
+        self._missing_payload = None
+
+    def _current(self):
+        version = self.version()
+        if version != self._built_version:
+            with self._lock:
+                if version != self._built_version:
+                    self._payloads = {key: Payload(body) for key, body in self.build().items()}
+                    self._missing_payload = Payload(self.missing)
+                    self._built_version = version
+                    inc('model_rebuilds_total', model='http_payloads')
+        return self._payloads, self._missing_payload
+
+    def respond(self, key=None):
+        payloads, missing = self._current()
+        return payloads.get(key, missing).response(self.mimetype, self.max_age)
+
+
+##################### Static Files ################
+_static_versions = {}
+
+
+# Short content hash of a static file, appended to its URLs as ?v=
+def static_version(root, filename):
+    path = os.path.join(root, filename)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _static_versions.get(path)
+    if cached is None or cached[0] != signature:
+        with open(path, 'rb') as static_file:
+            cached = (signature, hashlib.sha1(static_file.read()).hexdigest()[:12])
+        _static_versions[path] = cached
+    return cached[1]
+
+
+# Serve static/ through WhiteNoise with far-future caching, and version
+# url_for('static', ...) links so a changed file gets a new URL
+def serve_static(app, max_age=STATIC_MAX_AGE):
+    from whitenoise import WhiteNoise
+
+    app.wsgi_app = WhiteNoise(app.wsgi_app, root=app.static_folder, prefix=app.static_url_path, max_age=max_age)
+
+    @app.url_defaults
+    def add_static_version(endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            version = static_version(app.static_folder, values['filename'])
+            if version:
+                values['v'] = version
+
+
+# Write .gz (and .br with brotli installed) copies next to each static file so
+# WhiteNoise can serve them without compressing per request
+def compress_static(root):
+    from whitenoise.compress import Compressor
+
+    compressor = Compressor(use_brotli=HAS_BROTLI, quiet=True)
+    written = []
+    for dirpath, _, files in os.walk(root):
+        for filename in files:
+            if compressor.should_compress(filename):
+                written.extend(compressor.compress(os.path.join(dirpath, filename)))
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pre-compress static files for WhiteNoise.')
+    parser.add_argument('root', nargs='?', default='static')
+    args = parser.parse_args()
+
+    for path in compress_static(args.root):
+        print(path)
@@ -0,0 +1,50 @@
+import os
+
+import numpy as np
+
+
+# Share of the blended score that comes from content similarity; the rest comes from CF
+HYBRID_CONTENT_WEIGHT = float(os.environ.get('HYBRID_CONTENT_WEIGHT', 0.5))
+
+# Courses shown for a blended recommendation
+HYBRID_TOP_N = int(os.environ.get('HYBRID_TOP_N', 20))
+
+# Predicted ratings are scaled from this range to 0..1 before blending
+RATING_SCALE = (1, 5)
+
+
+# Fuse content-based and CF candidates by course row.
+#
+# Content scores are cosine similarities in 0..1 and CF scores are predicted
+# ratings, scaled to 0..1; a course missing from one list scores 0 there.
+# Returns (rows, blended scores, predicted ratings with NaN where CF gave
+# none), best first, with ties in order of first appearance, content first.
+def blend(content_rows, content_scores, cf_rows, cf_ratings, top_n=HYBRID_TOP_N, weight=HYBRID_CONTENT_WEIGHT):
+    content_rows = np.asarray(content_rows, dtype=np.intp)
+    cf_rows = np.asarray(cf_rows, dtype=np.intp)
+    cf_ratings = np.asarray(cf_ratings, dtype=np.float64)
+    low, high = RATING_SCALE
+
+    rows, first, inverse = np.unique(np.concatenate([content_rows, cf_rows]), return_index=True, return_inverse=True)
+    contributions = np.concatenate([
+        weight * np.asarray(content_scores, dtype=np.float64),
+        (1 - weight) * (cf_ratings - low) / (high - low),
+    ])
+    blended = np.bincount(inverse, weights=contributions, minlength=len(rows))
+    predicted = np.full(len(rows), np.nan)
+    predicted[inverse[len(content_rows):]] = cf_ratings
+
+    order = np.lexsort((first, -blended))[:top_n]
+    return rows[order], blended[order], predicted[order]
+
+
+# Course dicts for the given catalog rows, copied from records built once per
+# catalog; predicted ratings are attached where known
+def hydrate(records, rows, predicted=None):
+    courses = []
+    for i, row in enumerate(rows):
+        course = dict(records[row])
+        if predicted is not None and not np.isnan(predicted[i]):
+            course['predicted_rating'] = float(predicted[i])
+        courses.append(course)
+    return courses
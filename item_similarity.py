@@ -0,0 +1,112 @@
+import os
+import threading
+
+import numpy as np
+import scipy.sparse as sp
+
+from metrics import stage, inc
+
+
+# Number of most similar courses kept per course
+ITEM_NEIGHBORS = int(os.environ.get('ITEM_NEIGHBORS', 50))
+
+
+# Precomputed, top-k pruned course-course cosine similarity table.
+#
+# The full co-rating matrix G = R^T R is small (courses x courses) and kept
+# dense. A new rating from a user only changes G in the row and column of the
+# rated course, at the courses that user has rated, so an update adds those
+# deltas and marks the affected rows dirty. Dirty rows are re-pruned the next
+# time the table is read.
+class ItemSimilarity:
+    def __init__(self, ratings_matrix, k=ITEM_NEIGHBORS):
+        self.ratings_matrix = ratings_matrix
+        self.k = k
+        self._lock = threading.RLock()
+        self.rebuild()
+
+    def rebuild(self):
+        with self._lock:
+            matrix = self.ratings_matrix.matrix().astype(np.float64)
+            self._gram = (matrix.T @ matrix).toarray()
+            self._rows = {}
+            self._dirty = set(range(self._gram.shape[0]))
+            self._table = None
+        inc('model_rebuilds_total', model='item_similarity')
+
+    def _grow(self, n_courses):
+        missing = n_courses - self._gram.shape[0]
+        if missing > 0:
+            self._gram = np.pad(self._gram, ((0, missing), (0, missing)))
+            self._dirty.update(range(n_courses - missing, n_courses))
+
+    # Apply one upserted rating. previous is the rating it replaced (0 if new)
+    def update(self, user_id, course_id, previous, rating):
+        col = self.ratings_matrix.course_index.get(course_id)
+        if col is None:
+            return
+        cols, values = self.ratings_matrix.user_ratings(user_id)
+        with self._lock:
+            self._grow(len(self.ratings_matrix.course_ids))
+            delta = rating - previous
+            others = cols != col
+            self._gram[col, cols[others]] += delta * values[others]
+            self._gram[cols[others], col] += delta * values[others]
+            self._gram[col, col] += rating * rating - previous * previous
+
+            # Every course co-rated with this one sees a new similarity to it
+            self._dirty.add(col)
+            self._dirty.update(np.flatnonzero(self._gram[col]).tolist())
+            self._table = None
+
+    def _prune_row(self, col, norms):
+        similarities = self._gram[col] / np.where(norms * norms[col] > 0, norms * norms[col], np.inf)
+        similarities[col] = 0
+        candidates = np.flatnonzero(similarities > 0)
+        if len(candidates) > self.k:
+            candidates = candidates[np.argpartition(-similarities[candidates], self.k - 1)[:self.k]]
+        self._rows[col] = (candidates, similarities[candidates])
+
+    # Pruned similarity table as CSR: row j holds the top-k neighbors of course j
+    def table(self):
+        with self._lock:
+            if self._table is None:
+                norms = np.sqrt(np.diag(self._gram))
+                for col in self._dirty:
+                    self._prune_row(col, norms)
+                self._dirty = set()
+
+                n = self._gram.shape[0]
+                empty = (np.empty(0, dtype=np.intp), np.empty(0))
+                indptr, indices, data = [0], [empty[0]], [empty[1]]
+                for j in range(n):
+                    neighbors, similarities = self._rows.get(j, empty)
+                    indices.append(neighbors)
+                    data.append(similarities)
+                    indptr.append(indptr[-1] + len(neighbors))
+                self._table = sp.csr_matrix((np.concatenate(data), np.concatenate(indices), indptr), shape=(n, n))
+                self._table.sort_indices()
+                inc('model_rebuilds_total', model='item_similarity_table')
+            return self._table
+
+    # Predicted ratings for every course, plus the similarity mass behind each
+    # prediction (0 where no rated course is a neighbor)
+    def predict(self, user_id):
+        with stage('item_similarity'):
+            return self._predict(user_id)
+
+    def _predict(self, user_id):
+        with self._lock:
+            table = self.table()
+            cols, values = self.ratings_matrix.user_ratings(user_id)
+        # Courses rated since the table last grew have no row in it yet
+        n = table.shape[0]
+        known = cols < n
+        cols, values = cols[known], values[known]
+        user_vector = sp.csr_matrix((values, (np.zeros(len(cols), dtype=np.intp), cols)), shape=(1, n))
+        rated_mask = sp.csr_matrix((np.ones(len(cols)), (np.zeros(len(cols), dtype=np.intp), cols)), shape=(1, n))
+
+        weighted_sum = np.asarray((user_vector @ table).todense()).ravel()
+        weight_total = np.asarray((rated_mask @ table).todense()).ravel()
+        predicted = np.divide(weighted_sum, weight_total, out=np.zeros_like(weighted_sum), where=weight_total > 0)
+        return predicted, weight_total
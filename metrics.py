@@ -0,0 +1,252 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Each process writes its metrics here so /metrics can merge all gunicorn workers
+METRICS_DIR = os.environ.get('METRICS_DIR', '.metrics')
+
+# Seconds between a process's writes of its metrics file
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1.0))
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Every metric the app records, as name: (type, help)
+METRICS = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by route, method and status.'),
+    'stage_duration_seconds': ('histogram', 'Time spent in each recommender stage.'),
+    'cache_requests_total': ('counter', 'Cache lookups by cache and result (hit, miss, or coalesced into a computation in progress).'),
+    'ratings_ingested_total': ('counter', 'Ratings written to the ratings store.'),
+    'ratings_ingest_failures_total': ('counter', 'Ratings in batches the store failed to write, by result (retried or dropped).'),
+    'model_rebuilds_total': ('counter', 'Models and indexes built or rebuilt, by model.'),
+    'executor_rejected_total': ('counter', 'Recommendation tasks refused because the executor queue was full.'),
+    'executor_timeouts_total': ('counter', 'Recommendation tasks a request stopped waiting for.'),
+}
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_file_name = None
+_last_flush = 0.0
+
+
+def _key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+    _maybe_flush()
+
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0]
+        counts = histogram[0]
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        histogram[1] += seconds
+    _maybe_flush()
+
+
+# Time a recommender stage, e.g. with stage('tfidf_fit'): ...
+@contextmanager
+def stage(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('stage_duration_seconds', time.perf_counter() - started, stage=name)
+
+
+def cache_result(cache, hit):
+    inc('cache_requests_total', cache=cache, result='hit' if hit else 'miss')
+
+
+##################### Multi-process Files ################
+def _snapshot():
+    with _lock:
+        return {
+            'counters': [[name, list(labels), value] for (name, labels), value in _counters.items()],
+            'histograms': [[name, list(labels), list(counts), total] for (name, labels), (counts, total) in _histograms.items()],
+        }
+
+
+# Threads of a process share one file and its .tmp, so only one writes at a time
+def flush():
+    global _file_name, _last_flush
+    with _flush_lock:
+        _last_flush = time.monotonic()
+        # Named by process group, pid and start time, so a reused pid never
+        # overwrites another process's totals
+        if _file_name is None or f'-{os.getpid()}-' not in _file_name:
+            _file_name = f'{_process_group()}-{os.getpid()}-{time.time_ns()}.json'
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, _file_name)
+        with open(path + '.tmp', 'w') as metrics_file:
+            json.dump(_snapshot(), metrics_file)
+        os.replace(path + '.tmp', path)
+
+
+# Keep a process's last interval when it exits
+@atexit.register
+def _flush_at_exit():
+    if _counters or _histograms:
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+def _maybe_flush():
+    # Requests arriving while another thread writes leave the flush to it
+    if time.monotonic() - _last_flush >= METRICS_FLUSH_INTERVAL and not _flush_lock.locked():
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+# gunicorn's master, its workers and their pool processes share a process
+# group; a script run from a shell (precompute.py, als_model.py, a benchmark)
+# gets its own
+def _process_group():
+    return os.getpgid(0) if hasattr(os, 'getpgid') else os.getpid()
+
+
+def _group_alive(group):
+    try:
+        os.killpg(group, 0) if hasattr(os, 'killpg') else os.kill(group, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+# Counters and histograms summed over this process and every other process
+# of the same server, including workers that have exited. Files of other
+# process groups are left out, and deleted once their group is gone, so
+# neither scripts that import the app nor earlier runs of the server count.
+def _merged():
+    snapshots = [_snapshot()]
+    group = _process_group()
+    for path in glob.glob(os.path.join(METRICS_DIR, '*.json')):
+        name = os.path.basename(path)
+        if name == _file_name:
+            continue
+        try:
+            file_group = int(name.split('-', 1)[0])
+        except ValueError:
+            continue
+        if file_group != group:
+            if not _group_alive(file_group):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            continue
+        try:
+            with open(path) as metrics_file:
+                snapshots.append(json.load(metrics_file))
+        except (OSError, ValueError):
+            continue
+
+    counters = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(label) for label in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total in snapshot['histograms']:
+            key = (name, tuple(tuple(label) for label in labels))
+            merged = histograms.setdefault(key, [[0] * len(counts), 0.0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+    return counters, histograms
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+# Prometheus text exposition format
+def render():
+    counters, histograms = _merged()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {value}')
+        else:
+            for (metric, labels), (counts, total) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(labels, [("le", str(bound))])} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {total}')
+                lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+##################### Flask ################
+# Record every request's latency by route and serve /metrics
+def instrument(app):
+    from flask import Response, g, request, before_render_template, template_rendered
+
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def record_latency(exc):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        status = g.pop('metrics_status', 500)
+        observe('http_request_duration_seconds', time.perf_counter() - started,
+                route=route, method=request.method, status=status)
+
+    def render_started(sender, template, context, **extra):
+        g.setdefault('metrics_render_started', []).append(time.perf_counter())
+
+    def render_finished(sender, template, context, **extra):
+        starts = g.get('metrics_render_started')
+        if starts:
+            observe('stage_duration_seconds', time.perf_counter() - starts.pop(), stage='render_template')
+
+    before_render_template.connect(render_started, app, weak=False)
+    template_rendered.connect(render_finished, app, weak=False)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render(), mimetype='text/plain; version=0.0.4')
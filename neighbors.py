@@ -0,0 +1,134 @@
+import os
+import threading
+
+import numpy as np
+
+from metrics import stage, inc
+
+
+# Number of neighbors used for user-based predictions
+CF_NEIGHBORS = int(os.environ.get('CF_NEIGHBORS', 20))
+
+# Random-projection LSH parameters. Rating vectors are sparse and dominated by
+# a few popular courses, so buckets need few bits and many tables to keep the
+# recall of the exact top CF_NEIGHBORS above 0.9 (tests/test_neighbors.py)
+LSH_TABLES = int(os.environ.get('LSH_TABLES', 32))
+LSH_BITS = int(os.environ.get('LSH_BITS', 6))
+
+# Below this many users an exact scan is cheaper than probing hash tables
+LSH_MIN_USERS = int(os.environ.get('LSH_MIN_USERS', 2000))
+
+
+# Approximate cosine neighbor search over the rows of a RatingsMatrix.
+#
+# Every user is hashed into LSH_TABLES tables by the signs of LSH_BITS random
+# projections of their rating vector. Users sharing a bucket with the target
+# in any table (or in a bucket one bit away) become candidates, and only the
+# candidates are scored exactly. Users are rehashed one at a time as their
+# ratings change, so the index never needs a full rebuild.
+class UserNeighbors:
+    def __init__(self, ratings_matrix, n_tables=LSH_TABLES, n_bits=LSH_BITS, seed=42):
+        self.ratings_matrix = ratings_matrix
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self._rng = np.random.default_rng(seed)
+        self._planes = np.empty((0, n_tables * n_bits), dtype=np.float32)
+        self._weights = (1 << np.arange(n_bits)).astype(np.int64)
+        self._tables = [{} for _ in range(n_tables)]
+        self._codes = np.empty((0, n_tables), dtype=np.int64)
+        self._lock = threading.RLock()
+        self.rebuild()
+
+    # New course columns get fresh random planes. Existing users are zero in
+    # those columns, so their hashes do not change.
+    def _ensure_planes(self, n_courses):
+        missing = n_courses - self._planes.shape[0]
+        if missing > 0:
+            extra = self._rng.standard_normal((missing, self._planes.shape[1])).astype(np.float32)
+            self._planes = np.vstack([self._planes, extra])
+
+    def _hash(self, projections):
+        bits = (projections > 0).reshape(len(projections), self.n_tables, self.n_bits)
+        return bits @ self._weights
+
+    def rebuild(self):
+        with self._lock:
+            matrix = self.ratings_matrix.matrix()
+            self._ensure_planes(matrix.shape[1])
+            codes = self._hash(np.asarray(matrix @ self._planes[:matrix.shape[1]]))
+            self._tables = [{} for _ in range(self.n_tables)]
+            for row, row_codes in enumerate(codes):
+                for table, code in zip(self._tables, row_codes):
+                    table.setdefault(code, set()).add(row)
+            self._codes = codes
+        inc('model_rebuilds_total', model='user_neighbors')
+
+    def update_user(self, user_id):
+        row = self.ratings_matrix.user_index.get(user_id)
+        if row is None:
+            return
+        cols, values = self.ratings_matrix.user_ratings(user_id)
+        with self._lock:
+            self._ensure_planes(len(self.ratings_matrix.course_ids))
+            projection = values @ self._planes[cols] if len(cols) else np.zeros(self._planes.shape[1])
+            new_codes = self._hash(projection[np.newaxis, :])[0]
+
+            if row < len(self._codes):
+                for table, code in zip(self._tables, self._codes[row]):
+                    table.get(code, set()).discard(row)
+            else:
+                grow = np.zeros((row + 1 - len(self._codes), self.n_tables), dtype=np.int64)
+                self._codes = np.vstack([self._codes, grow])
+
+            for table, code in zip(self._tables, new_codes):
+                table.setdefault(code, set()).add(row)
+            self._codes[row] = new_codes
+
+    def _candidates(self, row, k):
+        with self._lock:
+            codes = self._codes[row]
+            candidates = set()
+            for table, code in zip(self._tables, codes):
+                candidates |= table.get(code, set())
+            # Multi-probe: also look one bit away when the exact buckets are thin
+            if len(candidates) <= k:
+                for table, code in zip(self._tables, codes):
+                    for bit in range(self.n_bits):
+                        candidates |= table.get(code ^ (1 << bit), set())
+        candidates.discard(row)
+        return np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+
+    # Top-k most similar users to user_id as (row indices, cosine similarities)
+    def query(self, user_id, k=CF_NEIGHBORS):
+        with stage('neighbor_search'):
+            return self._query(user_id, k)
+
+    def _query(self, user_id, k):
+        row = self.ratings_matrix.user_index.get(user_id)
+        if row is None:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        matrix = self.ratings_matrix.matrix()
+        if matrix.shape[0] <= LSH_MIN_USERS:
+            candidates = np.delete(np.arange(matrix.shape[0]), row)
+        else:
+            if row >= len(self._codes):
+                self.update_user(user_id)
+            candidates = np.sort(self._candidates(row, k))
+        if not len(candidates):
+            return candidates, np.empty(0)
+
+        target = matrix[row]
+        candidate_ratings = matrix[candidates]
+        dots = np.asarray((candidate_ratings @ target.T).todense()).ravel()
+        norms = np.sqrt(np.asarray(candidate_ratings.multiply(candidate_ratings).sum(axis=1)).ravel())
+        target_norm = np.sqrt(target.multiply(target).sum())
+        similarities = np.divide(dots, norms * target_norm, out=np.zeros_like(dots), where=norms * target_norm > 0)
+
+        keep = similarities > 0
+        candidates, similarities = candidates[keep], similarities[keep]
+        if len(candidates) > k:
+            top = np.argpartition(-similarities, k - 1)[:k]
+            candidates, similarities = candidates[top], similarities[top]
+        order = np.argsort(-similarities, kind='stable')
+        return candidates[order], similarities[order]
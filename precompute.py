@@ -0,0 +1,214 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+# Bumped whenever the on-disk layout changes; older artifacts are ignored
+ARTIFACT_FORMAT = 1
+
+ARTIFACT_DIR = os.environ.get('RECS_ARTIFACT_DIR', 'artifacts')
+
+# File inside ARTIFACT_DIR naming the artifact the app should serve
+CURRENT_POINTER = 'CURRENT'
+
+# Catalog files an artifact was built from; any change makes it stale
+SOURCE_FILES = ('courses.csv', 'Updated_Courses_with_Image_URLs.csv', 'subdomain_df.csv')
+
+# job_role and user rows index courses.csv, subdomain rows index Updated_Courses_with_Image_URLs.csv
+SECTIONS = ('job_role', 'subdomain', 'user')
+
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def sources_sha1():
+    return {path: file_sha1(path) for path in SOURCE_FILES}
+
+
+##################### Reading ################
+# Precomputed top-N recommendations opened with mmap.
+#
+# Each section holds two fixed-width arrays, <section>_indices.npy (int32 course
+# row indices, -1 padded) and <section>_scores.npy (float32), with one row per
+# key. Numeric keys are stored sorted in <section>_keys.npy and looked up with a
+# binary search; job roles are listed in meta.json.
+class PrecomputedRecommendations:
+    def __init__(self, path):
+        with open(os.path.join(path, 'meta.json')) as meta_file:
+            self.meta = json.load(meta_file)
+        if self.meta.get('format') != ARTIFACT_FORMAT:
+            raise ValueError(f"Unsupported artifact format {self.meta.get('format')}")
+
+        self.path = path
+        self.top_n = self.meta['top_n']
+        self.ratings_generation = self.meta['ratings_generation']
+        self.cf_mode = self.meta['cf_mode']
+        self._sections = {}
+        for section in SECTIONS:
+            indices = np.load(os.path.join(path, f'{section}_indices.npy'), mmap_mode='r')
+            scores = np.load(os.path.join(path, f'{section}_scores.npy'), mmap_mode='r')
+            if section == 'job_role':
+                keys = {key: row for row, key in enumerate(self.meta['job_roles'])}
+            else:
+                keys = np.load(os.path.join(path, f'{section}_keys.npy'), mmap_mode='r')
+            self._sections[section] = (keys, indices, scores)
+
+    def _row(self, keys, key):
+        if isinstance(keys, dict):
+            return keys.get(key)
+        try:
+            key = int(key)
+        except (TypeError, ValueError):
+            return None
+        row = int(np.searchsorted(keys, key))
+        if row < len(keys) and keys[row] == key:
+            return row
+        return None
+
+    # (course row indices, scores) for a key, or None if the artifact cannot answer
+    def lookup(self, section, key, n):
+        if n > self.top_n:
+            return None
+        keys, indices, scores = self._sections[section]
+        row = self._row(keys, key)
+        if row is None:
+            return None
+        row_indices = np.asarray(indices[row, :n])
+        valid = row_indices >= 0
+        return row_indices[valid].astype(np.intp), np.asarray(scores[row, :n])[valid]
+
+
+# Open the current artifact, or return None if there is none or it is stale
+def load_artifact(root=ARTIFACT_DIR):
+    try:
+        with open(os.path.join(root, CURRENT_POINTER)) as pointer:
+            name = pointer.read().strip()
+        artifact = PrecomputedRecommendations(os.path.join(root, name))
+    except (OSError, ValueError, KeyError):
+        return None
+
+    if artifact.meta.get('sources') != sources_sha1():
+        return None
+    return artifact
+
+
+##################### Building ################
+_app = None
+
+
+# Builders score from the live models: importing app loads the current
+# artifact, and CF lookups would otherwise copy its (possibly stale) rows
+def _init_worker():
+    global _app
+    import app
+    app.precomputed = None
+    _app = app
+
+
+def _padded(rows, top_n):
+    indices = np.full((len(rows), top_n), -1, dtype=np.int32)
+    scores = np.zeros((len(rows), top_n), dtype=np.float32)
+    for i, (row_indices, row_scores) in enumerate(rows):
+        indices[i, :len(row_indices)] = row_indices
+        scores[i, :len(row_scores)] = row_scores
+    return indices, scores
+
+
+def _score_chunk(task):
+    section, keys, top_n = task
+    if _app is None:
+        _init_worker()
+    rows = []
+    for key in keys:
+        if section == 'job_role':
+            rows.append(_app.content_index.top_k(key, top_n))
+        elif section == 'user':
+            rows.append(_app.collaborative_filtering_scores(key, None, top_n))
+        else:
+            recommendation_system = _app.recommendation_system
+            model = recommendation_system.get_subdomain_model(key)
+            if model is None or not len(model.ranking):
+                rows.append(([], []))
+                continue
+            top = model.ranking[:top_n]
+            positions = recommendation_system.courses_df.index.get_indexer(model.related_courses.index[top])
+            rows.append((positions, model.scores[top]))
+    return _padded(rows, top_n)
+
+
+def _score_section(pool, section, keys, top_n, workers):
+    if not len(keys):
+        return _padded([], top_n)
+    chunks = [chunk for chunk in np.array_split(np.asarray(keys, dtype=object), workers * 4) if len(chunk)]
+    results = list(pool.map(_score_chunk, [(section, chunk.tolist(), top_n) for chunk in chunks]))
+    return np.vstack([indices for indices, _ in results]), np.vstack([scores for _, scores in results])
+
+
+def build_artifact(top_n=50, workers=None, root=ARTIFACT_DIR):
+    _init_worker()
+    workers = workers or os.cpu_count() or 1
+
+    job_roles = [str(job_role) for job_role in _app.courses_df['job_role'].unique()]
+    subdomain_ids = np.sort(_app.recommendation_system.subdomains_df['subdomain_id'].unique().astype(np.int64))
+    _app.rating_ingestor.sync()
+    user_ids = np.sort(np.asarray(_app.ratings_matrix.user_ids, dtype=np.int64))
+    # ALS rows are served only while this model is the published one; taken
+    # before scoring, so a model swapped in mid-build leaves the rows unused
+    als_model = _app.current_als_model()[0] if _app.CF_MODE == 'als' else None
+
+    name = time.strftime('recs-%Y%m%d-%H%M%S') + f'-{os.getpid()}'
+    path = os.path.join(root, name)
+    os.makedirs(path + '.tmp')
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for section, keys in (('job_role', job_roles), ('subdomain', subdomain_ids), ('user', user_ids)):
+            indices, scores = _score_section(pool, section, keys, top_n, workers)
+            np.save(os.path.join(path + '.tmp', f'{section}_indices.npy'), indices)
+            np.save(os.path.join(path + '.tmp', f'{section}_scores.npy'), scores)
+            if section != 'job_role':
+                np.save(os.path.join(path + '.tmp', f'{section}_keys.npy'), keys)
+
+    meta = {
+        'format': ARTIFACT_FORMAT,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'top_n': top_n,
+        'sources': sources_sha1(),
+        'ratings_generation': _app.rating_ingestor.generation,
+        'cf_mode': _app.CF_MODE,
+        'als_model': als_model.name if als_model is not None else None,
+        'job_roles': job_roles,
+        'counts': {'job_role': len(job_roles), 'subdomain': len(subdomain_ids), 'user': len(user_ids)},
+    }
+    with open(os.path.join(path + '.tmp', 'meta.json'), 'w') as meta_file:
+        json.dump(meta, meta_file, indent=2)
+    os.rename(path + '.tmp', path)
+
+    # Point the app at the new artifact atomically
+    pointer = os.path.join(root, CURRENT_POINTER)
+    with open(pointer + '.tmp', 'w') as pointer_file:
+        pointer_file.write(name + '\n')
+    os.replace(pointer + '.tmp', pointer)
+    return path, meta
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute top-N recommendations for every job role, subdomain and user.')
+    parser.add_argument('--top-n', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=None, help='processes to use (default: all cores)')
+    parser.add_argument('--out', default=ARTIFACT_DIR, help='artifact directory')
+    args = parser.parse_args()
+
+    started = time.time()
+    path, meta = build_artifact(args.top_n, args.workers, args.out)
+    counts = ', '.join(f'{count} {section}s' for section, count in meta['counts'].items())
+    print(f"Wrote {path} ({counts}) in {time.time() - started:.1f}s.")
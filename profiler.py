@@ -0,0 +1,239 @@
+import collections
+import glob
+import hmac
+import json
+import math
+import os
+import sys
+import threading
+import time
+import uuid
+
+
+# Token required in the X-Admin-Token header; the profiler is disabled without one
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+# Seconds between stack samples
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.005))
+
+# Longest on-demand profile, in seconds
+PROFILE_MAX_SECONDS = float(os.environ.get('PROFILE_MAX_SECONDS', 60))
+
+# Per-request profiles are written here so any worker can serve /admin/profile/<id>
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '.profiles')
+
+# Per-request profiles kept for /admin/profile/<id>
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 20))
+
+# Request header that attaches a profile to a single request
+PROFILE_HEADER = 'X-Profile'
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}'
+
+
+# Statistical profiler that samples thread stacks from a background thread.
+#
+# Every interval it reads sys._current_frames() and counts each stack, root
+# first, so the cost is paid by the sampler rather than by the profiled code.
+# With thread_id set, only that thread is sampled; threads in ignore never are.
+class SamplingProfiler:
+    def __init__(self, interval=PROFILE_INTERVAL, thread_id=None, ignore=()):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.ignore = set(ignore)
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = None
+        self.duration = 0.0
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id or thread_id in self.ignore:
+                continue
+            if self.thread_id is not None and thread_id != self.thread_id:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            self.stacks[tuple(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._started
+        return self
+
+    # One "frame;frame;frame count" line per distinct stack, as flamegraph.pl
+    # and speedscope read them
+    def collapsed(self):
+        return '\n'.join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common())
+
+    # Functions by self samples (leaf frame) with their total (anywhere on the stack)
+    def top(self, n=25):
+        self_counts = collections.Counter()
+        total_counts = collections.Counter()
+        for stack, count in self.stacks.items():
+            self_counts[stack[-1]] += count
+            for name in set(stack):
+                total_counts[name] += count
+        seen = sum(self.stacks.values()) or 1
+        return [
+            {'function': name, 'self': count, 'self_pct': round(100 * count / seen, 1),
+             'total': total_counts[name], 'total_pct': round(100 * total_counts[name] / seen, 1)}
+            for name, count in self_counts.most_common(n)
+        ]
+
+    def report(self):
+        return {
+            'duration_seconds': round(self.duration, 3),
+            'interval_seconds': self.interval,
+            'samples': self.samples,
+            'top': self.top(),
+            'collapsed': self.collapsed(),
+        }
+
+
+def authorized(token):
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+##################### Flask ################
+def _profile_path(profile_id):
+    return os.path.join(PROFILE_DIR, f'{profile_id}.json')
+
+
+# Write a profile where every worker can read it, keeping the newest PROFILE_KEEP
+def _keep_profile(report, profile_id=None):
+    profile_id = profile_id or uuid.uuid4().hex[:16]
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = _profile_path(profile_id)
+    with open(path + '.tmp', 'w') as profile_file:
+        json.dump(report, profile_file)
+    os.replace(path + '.tmp', path)
+
+    paths = sorted(glob.glob(os.path.join(PROFILE_DIR, '*.json')), key=os.path.getmtime, reverse=True)
+    for old_path in paths[PROFILE_KEEP:]:
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass
+    return profile_id
+
+
+def _load_profile(profile_id):
+    if len(profile_id) != 16 or not all(ch in '0123456789abcdef' for ch in profile_id):
+        return None
+    try:
+        with open(_profile_path(profile_id)) as profile_file:
+            return json.load(profile_file)
+    except (OSError, ValueError):
+        return None
+
+
+# A positive, finite float query argument, or None when it is malformed
+def _positive_arg(args, name, default):
+    try:
+        value = float(args.get(name, default))
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) and value > 0 else None
+
+
+# Sample every other thread for seconds from a background thread and store the
+# report under profile_id; until then the id reads as running
+def _profile_in_background(profile_id, seconds, interval):
+    _keep_profile({'status': 'running', 'seconds': seconds}, profile_id)
+
+    def run():
+        # This thread only sleeps, so it is left out
+        profiler = SamplingProfiler(interval=interval, ignore=[threading.get_ident()]).start()
+        time.sleep(seconds)
+        report = profiler.stop().report()
+        report['status'] = 'done'
+        _keep_profile(report, profile_id)
+
+    threading.Thread(target=run, name='admin-profile', daemon=True).start()
+
+
+# Admin endpoints for profiling a live worker:
+#   GET /admin/profile?seconds=N   starts sampling every thread for N seconds
+#                                  in the background and answers 202 at once
+#   GET /admin/profile/<id>        that profile, or one attached to an earlier request
+# and per-request profiles: a request sent with X-Profile: 1 and a valid
+# X-Admin-Token is sampled on its own thread, and its response carries
+# X-Profile-Id. Per-request profiles are shared through PROFILE_DIR, so the
+# id can be read from any worker. Add ?format=collapsed for plain flame graph input.
+def register(app):
+    from flask import Response, abort, g, jsonify, request, url_for
+
+    def require_admin():
+        if not authorized(request.headers.get('X-Admin-Token', '')):
+            abort(404)
+
+    def respond(report):
+        if request.args.get('format') == 'collapsed':
+            return Response(report['collapsed'] + '\n', mimetype='text/plain')
+        return jsonify(report)
+
+    @app.before_request
+    def start_request_profile():
+        if request.headers.get(PROFILE_HEADER) and authorized(request.headers.get('X-Admin-Token', '')):
+            g.request_profiler = SamplingProfiler(thread_id=threading.get_ident()).start()
+
+    @app.after_request
+    def finish_request_profile(response):
+        profiler = g.pop('request_profiler', None)
+        if profiler is not None:
+            report = profiler.stop().report()
+            report['request'] = f'{request.method} {request.full_path}'
+            response.headers['X-Profile-Id'] = _keep_profile(report)
+        return response
+
+    @app.route('/admin/profile')
+    def admin_profile():
+        require_admin()
+        seconds = _positive_arg(request.args, 'seconds', 10)
+        interval = _positive_arg(request.args, 'interval', PROFILE_INTERVAL)
+        if seconds is None or interval is None:
+            return jsonify({'status': 'error', 'message': 'seconds and interval must be positive numbers.'}), 400
+        # Sample on a background thread so the worker keeps serving the
+        # workload being profiled (a sync worker has no other thread)
+        profile_id = uuid.uuid4().hex[:16]
+        seconds = min(seconds, PROFILE_MAX_SECONDS)
+        _profile_in_background(profile_id, seconds, max(interval, 0.001))
+        location = url_for('admin_profile_result', profile_id=profile_id)
+        response = jsonify({'status': 'running', 'profile_id': profile_id, 'seconds': seconds, 'location': location})
+        response.status_code = 202
+        response.headers['Location'] = location
+        return response
+
+    @app.route('/admin/profile/<profile_id>')
+    def admin_profile_result(profile_id):
+        require_admin()
+        report = _load_profile(profile_id)
+        if report is None:
+            abort(404)
+        if report.get('status') == 'running':
+            response = jsonify(report)
+            response.status_code = 202
+            response.headers['Retry-After'] = str(max(1, math.ceil(report['seconds'])))
+            return response
+        return respond(report)
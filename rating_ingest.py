@@ -0,0 +1,123 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from metrics import inc
+
+
+# Ratings written to the store per transaction
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 500))
+
+# Ratings waiting to be written before submissions are refused
+INGEST_QUEUE_SIZE = int(os.environ.get('INGEST_QUEUE_SIZE', 10000))
+
+# Seconds between checks for ratings written by other worker processes
+INGEST_POLL_INTERVAL = float(os.environ.get('INGEST_POLL_INTERVAL', 1.0))
+
+# Attempts to write a batch before its ratings are logged and dropped
+INGEST_RETRIES = int(os.environ.get('INGEST_RETRIES', 5))
+
+logger = logging.getLogger(__name__)
+
+
+# Background rating ingestion.
+#
+# Request threads only validate and enqueue. A single writer thread per
+# process drains the queue in batches into the ratings store. The store's
+# sequence number is the generation counter: every process remembers the last
+# seq it applied, and sync() hands only the newer rows to on_ratings. The
+# writer calls sync() after each batch, and again every INGEST_POLL_INTERVAL
+# seconds, so ratings written by any gunicorn worker reach all of them.
+class RatingIngestor:
+    def __init__(self, store, on_ratings, generation):
+        self.store = store
+        self.on_ratings = on_ratings
+        self.generation = generation
+        self._queue = queue.Queue(maxsize=INGEST_QUEUE_SIZE)
+        self._sync_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    # Start the writer in the current process; safe to call after a fork
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='rating-ingest', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    # Enqueue one rating; raises queue.Full when the writer is too far behind
+    def submit(self, user_id, course_id, rating, timestamp):
+        self._ensure_started()
+        self._queue.put_nowait((user_id, course_id, rating, timestamp))
+
+    def _drain(self, first):
+        batch = [first]
+        while len(batch) < INGEST_BATCH_SIZE:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            self._write(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    # Write one batch, retrying with a growing pause; a batch that still fails
+    # is logged with its ratings so they can be replayed by hand
+    def _write(self, batch):
+        for attempt in range(1, INGEST_RETRIES + 1):
+            try:
+                self.store.append_many(batch)
+                inc('ratings_ingested_total', len(batch))
+                return
+            except Exception:
+                if attempt < INGEST_RETRIES:
+                    logger.warning('Writing %d ratings failed (attempt %d of %d), retrying',
+                                   len(batch), attempt, INGEST_RETRIES, exc_info=True)
+                    inc('ratings_ingest_failures_total', len(batch), result='retried')
+                    time.sleep(INGEST_POLL_INTERVAL * attempt)
+                else:
+                    logger.exception('Dropping %d ratings after %d failed writes: %r', len(batch), attempt, batch)
+                    inc('ratings_ingest_failures_total', len(batch), result='dropped')
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=INGEST_POLL_INTERVAL)
+            except queue.Empty:
+                first = None
+            try:
+                if first is not None:
+                    self._drain(first)
+                self.sync()
+            except Exception:
+                # Keep the writer alive; the next batch or poll retries the sync
+                logger.exception('Applying new ratings failed')
+                time.sleep(INGEST_POLL_INTERVAL)
+
+    # Apply every rating newer than the last applied generation
+    def sync(self):
+        if self.store.max_seq() <= self.generation:
+            return 0
+        with self._sync_lock:
+            rows = self.store.since(self.generation)
+            if rows:
+                self.on_ratings([row[1:] for row in rows])
+                self.generation = rows[-1][0]
+            return len(rows)
+
+    # Block until everything queued so far is written and applied
+    def flush(self):
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.join()
+        self.sync()
@@ -1,52 +1,116 @@
+import argparse
+import os
+
 import pandas as pd
 import numpy as np
 
-# Define job roles and courses
-courses = {
-    'UI/UX Designer': ['1', '5', '21', '42'],
-    'Tester': ['2', '10', '12', '15', '31', '35'],
-    'Frontend Developer': ['3', '29', '37', '45'],
-    'DevOps': ['4', '8', '9', '13', '19', '49'],
-    'Web Developer': ['6'],
-    'Software Engineer': ['7', '33'],
-    'Admin': ['11', '23', '39', '48'],
-    'Scrum Master': ['16', '22', '27', '30'],
-    'Project Manager': ['24', '34', '50'],
-    'Data Analyst': ['14', '17', '20', '28', '38', '40', '43', '47'],
-    'Data Engineer': ['18', '26', '36', '44'],
-    'Backend Developer': ['46']
-}
-
-# Define synthetic data
-users = [f'{i}' for i in range(1, 21)]  # 20 users
-
-# Create a DataFrame to store ratings
-ratings_data = {
-    'user_id': [],
-    'course_id': [],
-    'rating': []
-}
-
-# Generate synthetic ratings
-np.random.seed(42)  # For reproducibility
-
-for user in users:
-    # Randomly assign a job role to each user
-    job_role = np.random.choice(list(courses.keys()))
-    # Select courses relevant to the user's job role
-    relevant_courses = courses[job_role]
-    # Rate a random selection of relevant courses
-    rated_courses = np.random.choice(relevant_courses, size=np.random.randint(1, len(relevant_courses)+1), replace=False)
-    for course in rated_courses:
-        rating = np.random.randint(1, 6)  # Ratings between 1 and 5
-        ratings_data['user_id'].append(user)
-        ratings_data['course_id'].append(course)
-        ratings_data['rating'].append(rating)
-
-# Convert to DataFrame
-ratings_df = pd.DataFrame(ratings_data)
-
-# Save to CSV
-ratings_df.to_csv('ratings.csv', index=False)
-
-print("Synthetic ratings data generated and saved to 'ratings.csv'.")
+
+# Exponents of the power laws user activity and course popularity follow:
+# the user (course) of rank r is picked with weight r ** -exponent
+USER_ACTIVITY_EXPONENT = 0.8
+COURSE_POPULARITY_EXPONENT = 0.9
+
+
+# Sampler over n items where the item of rank r has weight r ** -exponent.
+# Ranks are shuffled onto items, so popular items are spread over the id range.
+class PowerLaw:
+    def __init__(self, rng, n, exponent):
+        weights = np.arange(1, n + 1, dtype=np.float64) ** -exponent
+        self.cdf = np.cumsum(weights)
+        self.cdf /= self.cdf[-1]
+        self.items = rng.permutation(n)
+
+    def sample(self, rng, size):
+        ranks = np.minimum(np.searchsorted(self.cdf, rng.random(size), side='right'), len(self.cdf) - 1)
+        return self.items[ranks]
+
+
+# Ratings in chunks of chunk_size rows, with timestamps increasing across the
+# whole stream between start and end.
+#
+# Users are picked by a power law over activity, courses by a power law over
+# popularity. With course_roles (the job role of each course), every user is
+# given a job role and only rates that role's courses, as the original
+# generator did. A rating is 3 plus a per-user and a per-course bias plus
+# noise, rounded into 1..5. Memory stays proportional to the number of users
+# and courses, whatever the number of ratings.
+def iter_ratings(user_ids, course_ids, num_ratings, chunk_size=100_000, seed=None,
+                 start='2023-01-01', end='2025-01-01', course_roles=None):
+    rng = np.random.default_rng(seed)
+    user_ids = np.asarray(user_ids)
+    course_ids = np.asarray(course_ids)
+    users = PowerLaw(rng, len(user_ids), USER_ACTIVITY_EXPONENT)
+    if course_roles is None:
+        courses = PowerLaw(rng, len(course_ids), COURSE_POPULARITY_EXPONENT)
+    else:
+        role_codes, roles = pd.factorize(np.asarray(course_roles))
+        role_courses = [np.flatnonzero(role_codes == role) for role in range(len(roles))]
+        role_popularity = [PowerLaw(rng, len(rows), COURSE_POPULARITY_EXPONENT) for rows in role_courses]
+        user_roles = rng.integers(0, len(roles), len(user_ids))
+    user_bias = rng.normal(0.3, 0.6, len(user_ids))
+    course_bias = rng.normal(0.2, 0.7, len(course_ids))
+
+    start = np.datetime64(pd.Timestamp(start), 's')
+    span = (np.datetime64(pd.Timestamp(end), 's') - start).astype(np.int64)
+    for first in range(0, num_ratings, chunk_size):
+        size = min(chunk_size, num_ratings - first)
+        user_rows = users.sample(rng, size)
+        if course_roles is None:
+            course_rows = courses.sample(rng, size)
+        else:
+            course_rows = np.empty(size, dtype=np.intp)
+            chunk_roles = user_roles[user_rows]
+            for role in np.unique(chunk_roles):
+                picked = chunk_roles == role
+                course_rows[picked] = role_courses[role][role_popularity[role].sample(rng, int(picked.sum()))]
+        rating = np.clip(np.rint(3 + user_bias[user_rows] + course_bias[course_rows] + rng.normal(0, 0.8, size)), 1, 5)
+
+        # Each chunk covers its share of the time span, so the stream stays sorted
+        low = span * first // num_ratings
+        high = span * (first + size) // num_ratings
+        offsets = np.sort(rng.integers(low, max(high, low + 1), size))
+        yield pd.DataFrame({
+            'user_id': user_ids[user_rows],
+            'course_id': course_ids[course_rows],
+            'rating': rating.astype(np.int64),
+            'timestamp': start + offsets.astype('timedelta64[s]'),
+        })
+
+
+# 12-digit user ids like the ones in ratings.csv
+def make_user_ids(num_users, seed=None):
+    rng = np.random.default_rng(seed)
+    return rng.choice(9 * 10 ** 11, num_users, replace=False) + 10 ** 11
+
+
+# Stream ratings to a CSV chunk by chunk; returns the number of rows written
+def write_ratings_csv(path, user_ids, course_ids, num_ratings, chunk_size=100_000, seed=None, course_roles=None):
+    written = 0
+    tmp = f'{path}.{os.getpid()}.tmp'
+    for chunk in iter_ratings(user_ids, course_ids, num_ratings, chunk_size, seed, course_roles=course_roles):
+        chunk.to_csv(tmp, mode='a' if written else 'w', header=not written, index=False)
+        written += len(chunk)
+    if not written:
+        # No rows to stream; still write the header
+        pd.DataFrame(columns=['user_id', 'course_id', 'rating', 'timestamp']).to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic ratings for the courses in a catalog.')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--ratings', type=int, default=100)
+    parser.add_argument('--courses-csv', default='courses.csv', help='catalog to draw course ids from')
+    parser.add_argument('--chunk-size', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--any-role', action='store_true', help="let users rate courses outside their job role's")
+    parser.add_argument('--out', default='ratings.csv')
+    args = parser.parse_args()
+
+    courses_df = pd.read_csv(args.courses_csv).drop_duplicates(subset='course_id')
+    course_roles = None if args.any_role or 'job_role' not in courses_df else courses_df['job_role'].to_numpy()
+    user_ids = make_user_ids(args.users, args.seed)
+    written = write_ratings_csv(args.out, user_ids, courses_df['course_id'].to_numpy(), args.ratings,
+                                args.chunk_size, args.seed, course_roles)
+    print(f"Synthetic ratings data generated and saved to '{args.out}' ({written} ratings).")
@@ -0,0 +1,171 @@
+import threading
+
+import numpy as np
+import scipy.sparse as sp
+
+
+# Persistent user-course ratings matrix.
+#
+# Users and courses get stable row/column indices the first time they are
+# seen, and new ids are appended at the end, so indices handed out earlier
+# never move. Ratings live in CSR arrays; overwriting an existing rating is an
+# in-place write into the data array, which the matrix() CSR shares, so it
+# needs no rebuild. New (user, course) pairs go into a small pending set that
+# is folded into fresh CSR arrays the next time the whole matrix is needed.
+class RatingsMatrix:
+    def __init__(self):
+        self.user_ids = []
+        self.course_ids = []
+        self.user_index = {}
+        self.course_index = {}
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.empty(0, dtype=np.int32)
+        self._data = np.empty(0, dtype=np.float32)
+        self._pending = {}
+        self._csr = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_frame(cls, ratings_df):
+        matrix = cls()
+        if ratings_df.empty:
+            return matrix
+
+        # Keep only the latest rating for every user-course combination
+        cleaned = ratings_df.sort_values(by='timestamp').drop_duplicates(subset=['user_id', 'course_id'], keep='last')
+
+        for user_id in sorted(cleaned['user_id'].unique()):
+            matrix._add_user(user_id)
+        for course_id in sorted(cleaned['course_id'].unique()):
+            matrix._add_course(course_id)
+
+        rows = cleaned['user_id'].map(matrix.user_index).to_numpy()
+        cols = cleaned['course_id'].map(matrix.course_index).to_numpy()
+        values = cleaned['rating'].to_numpy(dtype=np.float32)
+        csr = sp.csr_matrix((values, (rows, cols)), shape=matrix.shape, dtype=np.float32)
+        csr.sort_indices()
+        matrix._set_csr(csr)
+        return matrix
+
+    @property
+    def shape(self):
+        return (len(self.user_ids), len(self.course_ids))
+
+    @property
+    def nnz(self):
+        return len(self._data) + sum(len(cols) for cols in self._pending.values())
+
+    def _add_user(self, user_id):
+        row = self.user_index.get(user_id)
+        if row is None:
+            row = len(self.user_ids)
+            self.user_ids.append(user_id)
+            self.user_index[user_id] = row
+        return row
+
+    def _add_course(self, course_id):
+        col = self.course_index.get(course_id)
+        if col is None:
+            col = len(self.course_ids)
+            self.course_ids.append(course_id)
+            self.course_index[course_id] = col
+        return col
+
+    def _set_csr(self, csr):
+        self._indptr = csr.indptr.astype(np.int64)
+        self._indices = csr.indices.astype(np.int32)
+        self._data = csr.data.astype(np.float32)
+        self._pending = {}
+        self._csr = None
+
+    def _find(self, row, col):
+        if row + 1 >= len(self._indptr):
+            return -1
+        start, end = self._indptr[row], self._indptr[row + 1]
+        pos = start + np.searchsorted(self._indices[start:end], col)
+        if pos < end and self._indices[pos] == col:
+            return pos
+        return -1
+
+    # Insert or overwrite one rating; the newest value always wins.
+    # Returns the previous rating, or 0 if the pair was not rated before.
+    def upsert(self, user_id, course_id, rating):
+        with self._lock:
+            row = self._add_user(user_id)
+            col = self._add_course(course_id)
+
+            pos = self._find(row, col)
+            if pos >= 0:
+                previous = float(self._data[pos])
+                self._data[pos] = rating
+            else:
+                cols = self._pending.setdefault(row, {})
+                previous = cols.get(col, 0.0)
+                cols[col] = rating
+                self._csr = None
+            return previous
+
+    def get(self, user_id, course_id):
+        row = self.user_index.get(user_id)
+        col = self.course_index.get(course_id)
+        if row is None or col is None:
+            return 0.0
+        with self._lock:
+            pos = self._find(row, col)
+            if pos >= 0:
+                return float(self._data[pos])
+            return self._pending.get(row, {}).get(col, 0.0)
+
+    # Column indices and ratings of one user, without materializing the matrix
+    def user_ratings(self, user_id):
+        row = self.user_index.get(user_id)
+        if row is None:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        with self._lock:
+            if row + 1 < len(self._indptr):
+                start, end = self._indptr[row], self._indptr[row + 1]
+                cols, values = self._indices[start:end], self._data[start:end]
+            else:
+                cols, values = self._indices[:0], self._data[:0]
+            pending = self._pending.get(row)
+            if pending:
+                cols = np.concatenate([cols, np.fromiter(pending.keys(), dtype=np.int32, count=len(pending))])
+                values = np.concatenate([values, np.fromiter(pending.values(), dtype=np.float32, count=len(pending))])
+            return cols.copy(), values.copy()
+
+    # Fold pending ratings into the CSR arrays. This touches only the stored
+    # nonzeros, never the rating history.
+    def _compact(self):
+        n_users, n_courses = self.shape
+        indptr = self._indptr
+        if len(indptr) < n_users + 1:
+            indptr = np.concatenate([indptr, np.full(n_users + 1 - len(indptr), indptr[-1])])
+
+        base = sp.csr_matrix((self._data, self._indices, indptr), shape=(n_users, n_courses))
+        if self._pending:
+            rows, cols, values = [], [], []
+            for row, row_cols in self._pending.items():
+                for col, value in row_cols.items():
+                    rows.append(row)
+                    cols.append(col)
+                    values.append(value)
+            base = base + sp.csr_matrix((np.asarray(values, dtype=np.float32), (rows, cols)), shape=(n_users, n_courses))
+            base.sort_indices()
+        self._set_csr(base)
+
+    # Current matrix as CSR (users x courses). It is a view of the stored
+    # arrays: overwritten ratings show up in it, while a structural change
+    # builds new arrays and leaves matrices handed out earlier as they were.
+    def matrix(self):
+        with self._lock:
+            if self._csr is None:
+                if self._pending or len(self._indptr) != self.shape[0] + 1:
+                    self._compact()
+                self._csr = sp.csr_matrix((self._data, self._indices, self._indptr), shape=self.shape, copy=False)
+            return self._csr
+
+    def user_row(self, user_id):
+        row = self.user_index.get(user_id)
+        if row is None:
+            return None
+        return self.matrix()[row]
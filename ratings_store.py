@@ -0,0 +1,178 @@
+import argparse
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+
+RATINGS_DB = os.environ.get('RATINGS_DB', 'ratings.db')
+RATINGS_CSV = 'ratings.csv'
+
+INSERT_RATINGS = 'INSERT INTO ratings (user_id, course_id, rating, timestamp) VALUES (?, ?, ?, ?)'
+
+
+# Append-only rating log in SQLite (WAL mode).
+#
+# Every submitted rating is one appended row with an increasing sequence
+# number; the latest rating for a (user_id, course_id) pair is the one with
+# the highest seq. WAL with synchronous=NORMAL only fsyncs at checkpoints, so
+# a batch of appends costs one commit and the fsyncs are amortized across
+# batches. Readers in other processes never block on writers.
+class RatingsStore:
+    def __init__(self, path=RATINGS_DB, csv_path=RATINGS_CSV):
+        self.path = path
+        self._lock = threading.RLock()
+        self._pid = None
+        self._conn = None
+        conn = self._connection()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS ratings ('
+            'seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'user_id INTEGER NOT NULL, '
+            'course_id INTEGER NOT NULL, '
+            'rating INTEGER NOT NULL, '
+            'timestamp TEXT)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ratings_pair ON ratings (user_id, course_id, seq)')
+
+        # Seed a fresh store from the legacy CSV. The emptiness check is
+        # repeated inside the import's transaction, so when several workers
+        # start on a new store only the first one imports it.
+        if csv_path and os.path.exists(csv_path) and self.max_seq() == 0:
+            self.import_csv(csv_path, if_empty=True)
+
+    # SQLite connections must not cross a fork, so each process opens its own
+    def _connection(self):
+        if self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._pid = os.getpid()
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._pid = None
+
+    # Run one statement in a write transaction; with if_empty, only when the
+    # log has no rows yet (returns None otherwise)
+    def _write(self, sql, rows=None, if_empty=False):
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if if_empty and conn.execute('SELECT 1 FROM ratings LIMIT 1').fetchone():
+                    cursor = None
+                elif rows is None:
+                    cursor = conn.execute(sql)
+                else:
+                    cursor = conn.executemany(sql, rows)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            return cursor
+
+    @staticmethod
+    def _rows(ratings):
+        return [
+            (int(user_id), int(course_id), int(rating), None if timestamp is None else str(timestamp))
+            for user_id, course_id, rating, timestamp in ratings
+        ]
+
+    # Append ratings in one transaction and return the latest seq
+    def append_many(self, ratings):
+        rows = self._rows(ratings)
+        if rows:
+            self._write(INSERT_RATINGS, rows)
+        return self.max_seq()
+
+    def append(self, user_id, course_id, rating, timestamp=None):
+        return self.append_many([(user_id, course_id, rating, timestamp)])
+
+    def max_seq(self):
+        with self._lock:
+            row = self._connection().execute('SELECT MAX(seq) FROM ratings').fetchone()
+        return row[0] or 0
+
+    # Drop every rating that has been superseded by a newer one for the same pair
+    def compact(self):
+        cursor = self._write(
+            'DELETE FROM ratings WHERE seq NOT IN '
+            '(SELECT MAX(seq) FROM ratings GROUP BY user_id, course_id)'
+        )
+        with self._lock:
+            self._connection().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return cursor.rowcount
+
+    # Latest rating per (user_id, course_id) up to seq up_to, oldest first
+    def load_latest(self, up_to=None):
+        if up_to is None:
+            up_to = self.max_seq()
+        with self._lock:
+            return pd.read_sql_query(
+                'SELECT user_id, course_id, rating, timestamp FROM ratings '
+                'WHERE seq IN (SELECT MAX(seq) FROM ratings WHERE seq <= ? GROUP BY user_id, course_id) '
+                'ORDER BY seq',
+                self._connection(),
+                params=(up_to,)
+            )
+
+    # Ratings appended after seq, oldest first, as (seq, user_id, course_id, rating) rows
+    def since(self, seq, limit=None):
+        sql = 'SELECT seq, user_id, course_id, rating FROM ratings WHERE seq > ? ORDER BY seq'
+        if limit is not None:
+            sql += f' LIMIT {int(limit)}'
+        with self._lock:
+            return self._connection().execute(sql, (seq,)).fetchall()
+
+    # Full rating log, oldest first
+    def load_all(self):
+        with self._lock:
+            return pd.read_sql_query('SELECT user_id, course_id, rating, timestamp FROM ratings ORDER BY seq', self._connection())
+
+    # Append the ratings of a CSV file in one transaction; with if_empty,
+    # only into an empty store. Returns the number of ratings imported.
+    def import_csv(self, csv_path, if_empty=False):
+        ratings_df = pd.read_csv(csv_path)
+        if ratings_df.empty:
+            return 0
+        if 'timestamp' not in ratings_df:
+            ratings_df['timestamp'] = None
+
+        # Same ordering the CSV has always been read with: by timestamp, rows
+        # without one last, so the last row of a pair is its latest rating
+        ratings_df = ratings_df.sort_values(by='timestamp', kind='stable')
+        timestamps = ratings_df['timestamp'].astype(object).where(ratings_df['timestamp'].notna(), None)
+        rows = self._rows(zip(ratings_df['user_id'], ratings_df['course_id'], ratings_df['rating'], timestamps))
+        if self._write(INSERT_RATINGS, rows, if_empty) is None:
+            return 0
+        return len(rows)
+
+    def export_csv(self, csv_path, latest_only=False):
+        ratings_df = self.load_latest() if latest_only else self.load_all()
+        ratings_df.to_csv(csv_path, index=False)
+        return len(ratings_df)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the ratings store.')
+    parser.add_argument('--db', default=RATINGS_DB)
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_parser = commands.add_parser('import', help='append the ratings of a CSV file')
+    import_parser.add_argument('csv_path')
+    export_parser = commands.add_parser('export', help='write the ratings to a CSV file')
+    export_parser.add_argument('csv_path')
+    export_parser.add_argument('--latest', action='store_true', help='only the latest rating per user and course')
+    commands.add_parser('compact', help='drop superseded ratings')
+    args = parser.parse_args()
+
+    store = RatingsStore(args.db, csv_path=None)
+    if args.command == 'import':
+        print(f"Imported {store.import_csv(args.csv_path)} ratings into {args.db}.")
+    elif args.command == 'export':
+        print(f"Exported {store.export_csv(args.csv_path, latest_only=args.latest)} ratings to {args.csv_path}.")
+    elif args.command == 'compact':
+        print(f"Removed {store.compact()} superseded ratings from {args.db}.")
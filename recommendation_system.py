@@ -1,6 +1,13 @@
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import pandas as pd
+import numpy as np
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from data_loader import load_csv
+from metrics import stage, inc, cache_result
+from embeddings import CourseEmbeddings
 
 # # Example datasets
 # subdomains_df = pd.DataFrame({
@@ -19,45 +26,158 @@ import pandas as pd
 #                            'Core principles and practices in nursing.'],
 #     'subdomain_id': [1, 1, 2, 3]
 # })
-domain_df = pd.read_csv('domain_df.csv', encoding='latin1')
-subdomains_df = pd.read_csv('subdomain_df.csv', encoding='latin1')
-courses_df = pd.read_csv('Updated_Courses_with_Image_URLs.csv', encoding='latin1')
+domain_df = load_csv('domain_df.csv')
 
+COURSES_CSV = 'Updated_Courses_with_Image_URLs.csv'
+SUBDOMAINS_CSV = 'subdomain_df.csv'
 
+# Maximum number of fitted subdomain models kept in memory
+SUBDOMAIN_CACHE_SIZE = int(os.environ.get('SUBDOMAIN_CACHE_SIZE', 128))
+
+# Everything needed to answer a subdomain query without refitting
+SubdomainModel = namedtuple('SubdomainModel', ['vectorizer', 'tfidf_matrix', 'related_courses', 'ranking', 'scores'])
+
+_model_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_embeddings = None
+_source_signature = None
+
+# Bumped every time the catalog is (re)loaded
+catalog_version = 0
+
+
+def _sources_signature():
+    signature = []
+    for path in (COURSES_CSV, SUBDOMAINS_CSV):
+        stat = os.stat(path)
+        signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def _load_sources():
+    global subdomains_df, courses_df, _source_signature, catalog_version, _embeddings
+    _source_signature = _sources_signature()
+    _embeddings = None
+    catalog_version += 1
+    subdomains_df = load_csv(SUBDOMAINS_CSV)
+    courses_df = load_csv(COURSES_CSV)
+    inc('model_rebuilds_total', model='catalog')
+
+
+# Reload the catalog and drop every cached model when either source CSV changes
+def refresh_if_changed():
+    if _sources_signature() == _source_signature:
+        return False
+    with _cache_lock:
+        if _sources_signature() == _source_signature:
+            return False
+        _load_sources()
+        _model_cache.clear()
+    return True
 
-def recommend_courses_by_subdomain(subdomain_id, top_n=10):
 
+_load_sources()
+
+
+def _build_subdomain_model(subdomain_id, courses_df, subdomains_df):
     # Retrieve subdomain details
     subdomain = subdomains_df[subdomains_df['subdomain_id'] == subdomain_id]
-    
     if subdomain.empty:
-        return pd.DataFrame(columns=['course_id', 'course_title', 'course_description', 'subdomain_id'])
-    
+        return None
+
     # Extract skills related to the subdomain
     subdomain_skills = subdomain['skills'].values[0]
-    
+
     # Filter courses related to the subdomain
     related_courses = courses_df[courses_df['subdomain_id'] == subdomain_id]
-    
     if related_courses.empty:
-        return pd.DataFrame(columns=['course_id', 'course_title', 'course_description', 'subdomain_id','course_url'])
-    
+        return SubdomainModel(None, None, related_courses, np.empty(0, dtype=np.intp), np.empty(0))
+
     # Vectorize course descriptions and subdomain skills
     tfidf_vectorizer = TfidfVectorizer(stop_words='english')
     course_descriptions = related_courses['course_description']
-    tfidf_matrix = tfidf_vectorizer.fit_transform(course_descriptions)
-    subdomain_vec = tfidf_vectorizer.transform([subdomain_skills])
-    
-    # Compute cosine similarity between subdomain skills and course descriptions
-    cosine_similarities = cosine_similarity(subdomain_vec, tfidf_matrix).flatten()
-    
-    # Get top N course indices
-    top_course_indices = cosine_similarities.argsort()[-top_n:][::-1]
-    
+    with stage('tfidf_fit'):
+        tfidf_matrix = tfidf_vectorizer.fit_transform(course_descriptions)
+    with stage('tfidf_transform'):
+        subdomain_vec = tfidf_vectorizer.transform([subdomain_skills])
+
+    # Compute cosine similarity between subdomain skills and course descriptions,
+    # and keep the full ranking so any top_n is a slice of it
+    with stage('similarity'):
+        cosine_similarities = cosine_similarity(subdomain_vec, tfidf_matrix).flatten()
+        ranking = cosine_similarities.argsort(kind='stable')[::-1]
+    inc('model_rebuilds_total', model='subdomain_model')
+
+    return SubdomainModel(tfidf_vectorizer, tfidf_matrix, related_courses, ranking, cosine_similarities)
+
+
+# Fitted model for a subdomain, built lazily and kept in a bounded LRU.
+# A model built from a catalog that was reloaded meanwhile is not cached.
+def get_subdomain_model(subdomain_id):
+    refresh_if_changed()
+
+    with _cache_lock:
+        hit = subdomain_id in _model_cache
+        if hit:
+            _model_cache.move_to_end(subdomain_id)
+            model = _model_cache[subdomain_id]
+        version, courses, subdomains = catalog_version, courses_df, subdomains_df
+    cache_result('subdomain_model', hit)
+    if hit:
+        return model
+
+    model = _build_subdomain_model(subdomain_id, courses, subdomains)
+
+    with _cache_lock:
+        if catalog_version == version:
+            _model_cache[subdomain_id] = model
+            _model_cache.move_to_end(subdomain_id)
+            while len(_model_cache) > SUBDOMAIN_CACHE_SIZE:
+                _model_cache.popitem(last=False)
+    return model
+
+
+# Catalog-wide LSA embeddings, built on first use after each catalog load.
+# The fit runs outside the lock and is only published if the catalog it was
+# built from is still the current one.
+def get_embeddings():
+    global _embeddings
+    refresh_if_changed()
+
+    with _cache_lock:
+        embeddings = _embeddings
+        version, courses, subdomains = catalog_version, courses_df, subdomains_df
+    cache_result('course_embeddings', embeddings is not None)
+    if embeddings is not None:
+        return embeddings
+
+    embeddings = CourseEmbeddings(courses, subdomains)
+    with _cache_lock:
+        if catalog_version == version:
+            if _embeddings is None:
+                _embeddings = embeddings
+            embeddings = _embeddings
+    return embeddings
+
+
+# Courses from any subdomain whose descriptions are closest to the subdomain's skills
+def recommend_courses_across_subdomains(subdomain_id, top_n=10):
+    embeddings = get_embeddings()
+    rows, _ = embeddings.for_subdomain(subdomain_id, top_n)
+    return embeddings.courses_df.iloc[rows]
+
+
+def recommend_courses_by_subdomain(subdomain_id, top_n=10):
+    model = get_subdomain_model(subdomain_id)
+
+    if model is None:
+        return pd.DataFrame(columns=['course_id', 'course_title', 'course_description', 'subdomain_id'])
+
+    if model.related_courses.empty:
+        return pd.DataFrame(columns=['course_id', 'course_title', 'course_description', 'subdomain_id','course_url'])
+
     # Get recommended courses
-    recommended_courses = related_courses.iloc[top_course_indices]
-    
-    return recommended_courses
+    return model.related_courses.iloc[model.ranking[:top_n]]
 
 # # Example usage
 # subdomain_id = 2  # Example subdomain ID
@@ -0,0 +1,107 @@
+import collections
+import os
+import sys
+import threading
+from concurrent.futures import Future
+
+from metrics import cache_result, inc
+
+
+# Memory the cached recommendation results may hold before the least recently used are dropped
+RESULT_CACHE_BYTES = int(os.environ.get('RESULT_CACHE_BYTES', 64 * 1024 * 1024))
+
+
+# Approximate memory held by a result: arrays, frames and tuples of them
+def result_size(value):
+    if hasattr(value, 'memory_usage'):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(result_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+# Recommendation results by normalized query, in front of every recommender.
+#
+# Each entry is stored with the version of the data it was computed from
+# (catalog version, ratings model generation, a user's rating version) and is
+# only returned while the caller's current version matches, so nothing
+# expires by time. Entries are evicted least recently used once their
+# estimated size passes max_bytes.
+#
+# submit() returns a Future. Concurrent misses for the same key and version
+# share the first caller's computation instead of each starting their own;
+# failed computations are not cached.
+class ResultCache:
+    def __init__(self, name='results', max_bytes=RESULT_CACHE_BYTES):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = collections.OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    # start() begins the computation and returns a Future for it, e.g.
+    # lambda: executor.submit(fn, *args)
+    def submit(self, key, version, start):
+        with self._lock:
+            entry = self._entries.get(key)
+            hit = entry is not None and entry[0] == version
+            owner = False
+            if hit:
+                self._entries.move_to_end(key)
+                future = Future()
+                future.set_result(entry[1])
+            else:
+                future = self._pending.get((key, version))
+                if future is None:
+                    future = self._pending[(key, version)] = Future()
+                    owner = True
+
+        if hit:
+            cache_result(self.name, True)
+            return future
+        if not owner:
+            inc('cache_requests_total', cache=self.name, result='coalesced')
+            return future
+
+        cache_result(self.name, False)
+        try:
+            task = start()
+        except Exception as e:
+            self._finish(key, version, future, error=e)
+            return future
+        task.add_done_callback(lambda task: self._finish(key, version, future, task=task))
+        return future
+
+    def _finish(self, key, version, future, task=None, error=None):
+        if error is None:
+            error = task.exception()
+        if error is None:
+            value = task.result()
+            size = result_size(value)
+            with self._lock:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self.size -= old[2]
+                if size <= self.max_bytes:
+                    self._entries[key] = (version, value, size)
+                    self.size += size
+                    while self.size > self.max_bytes:
+                        _, (_, _, evicted) = self._entries.popitem(last=False)
+                        self.size -= evicted
+                self._pending.pop((key, version), None)
+            future.set_result(value)
+        else:
+            with self._lock:
+                self._pending.pop((key, version), None)
+            future.set_exception(error)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
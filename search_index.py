@@ -0,0 +1,242 @@
+import array
+import bisect
+import math
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+from content_index import top_k_indices
+from metrics import inc, stage
+
+
+# Searched fields and how many times a token in each one counts
+SEARCH_FIELDS = {
+    'course_title': 2,
+    'course_title_english': 2,
+    'course_description': 1,
+    'subdomain_name': 1,
+    'subdomain_name_BM': 1,
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Postings are compacted once this share of indexed documents has been removed
+COMPACT_RATIO = 0.25
+
+_TOKEN = re.compile(r'[^\W_]+')
+
+
+# Lowercase word tokens with accents stripped; no stemming, so Malay and
+# English terms are matched as written
+def tokenize(text):
+    if not isinstance(text, str):
+        return []
+    text = unicodedata.normalize('NFKD', text.casefold())
+    return _TOKEN.findall(''.join(ch for ch in text if not unicodedata.combining(ch)))
+
+
+def _array(typecode, values):
+    packed = array.array(typecode)
+    packed.frombytes(np.ascontiguousarray(values).tobytes())
+    return packed
+
+
+# In-memory BM25 index over course text.
+#
+# Each term has a posting list of document numbers in ascending order
+# (array('I')) with the weighted term frequency of each (array('H')). A new
+# or changed course is appended under a new document number, so postings stay
+# sorted without a rebuild; a removed one is only marked dead until
+# COMPACT_RATIO of the documents are dead, when every posting list is
+# filtered and renumbered once.
+#
+# Queries are scored with MaxScore pruning: terms are scored rarest first,
+# and once the best score any unseen document could still reach (the sum of
+# the remaining terms' upper bounds) is below the current k-th best score,
+# the longer posting lists are only probed for the documents still in
+# contention.
+class SearchIndex:
+    def __init__(self, fields=SEARCH_FIELDS, k1=BM25_K1, b=BM25_B):
+        self.fields = fields
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._terms = {}
+        self._vocabulary = []
+        self._postings = []
+        self._frequencies = []
+        self._df = []
+        self._max_tf = []
+        self._lengths = array.array('I')
+        self._alive = bytearray()
+        self._doc_terms = []
+        self._keys = []
+        self._docs = {}
+        self._total_length = 0
+        self._removed = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, key):
+        return key in self._docs
+
+    def _term_id(self, term):
+        term_id = self._terms.get(term)
+        if term_id is None:
+            term_id = self._terms[term] = len(self._postings)
+            bisect.insort(self._vocabulary, term)
+            self._postings.append(array.array('I'))
+            self._frequencies.append(array.array('H'))
+            self._df.append(0)
+            self._max_tf.append(0)
+        return term_id
+
+    # Index or re-index one document; unchanged documents are skipped
+    def add(self, key, record):
+        signature = tuple(str(record.get(field, '')) for field in self.fields)
+        with self._lock:
+            existing = self._docs.get(key)
+            if existing is not None and existing[1] == signature:
+                return False
+            if existing is not None:
+                self._remove(existing[0])
+
+            counts = {}
+            for field, weight in self.fields.items():
+                for token in tokenize(record.get(field)):
+                    counts[token] = counts.get(token, 0) + weight
+
+            doc = len(self._keys)
+            term_ids = array.array('I')
+            for term, tf in counts.items():
+                term_id = self._term_id(term)
+                tf = min(tf, 0xFFFF)
+                self._postings[term_id].append(doc)
+                self._frequencies[term_id].append(tf)
+                self._df[term_id] += 1
+                self._max_tf[term_id] = max(self._max_tf[term_id], tf)
+                term_ids.append(term_id)
+            length = sum(counts.values())
+            self._lengths.append(length)
+            self._alive.append(1)
+            self._doc_terms.append(term_ids)
+            self._keys.append(key)
+            self._docs[key] = (doc, signature)
+            self._total_length += length
+            return True
+
+    def remove(self, key):
+        with self._lock:
+            existing = self._docs.pop(key, None)
+            if existing is None:
+                return False
+            self._remove(existing[0])
+            if self._removed > COMPACT_RATIO * len(self._keys):
+                self._compact()
+            return True
+
+    def _remove(self, doc):
+        self._alive[doc] = 0
+        for term_id in self._doc_terms[doc]:
+            self._df[term_id] -= 1
+        self._doc_terms[doc] = None
+        self._total_length -= self._lengths[doc]
+        self._removed += 1
+
+    def _compact(self):
+        alive = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+        renumbered = (np.cumsum(alive) - 1).astype(np.uint32)
+        for term_id, (postings, frequencies) in enumerate(zip(self._postings, self._frequencies)):
+            docs = np.frombuffer(postings, dtype=np.uint32)
+            keep = alive[docs]
+            tfs = np.frombuffer(frequencies, dtype=np.uint16)[keep]
+            self._postings[term_id] = _array('I', renumbered[docs[keep]])
+            self._frequencies[term_id] = _array('H', tfs)
+            self._max_tf[term_id] = int(tfs.max()) if len(tfs) else 0
+
+        self._lengths = _array('I', np.frombuffer(self._lengths, dtype=np.uint32)[alive])
+        self._alive = bytearray(b'\x01' * int(alive.sum()))
+        self._doc_terms = [terms for terms in self._doc_terms if terms is not None]
+        self._keys = [key for key, keep in zip(self._keys, alive) if keep]
+        self._docs = {key: (doc, self._docs[key][1]) for doc, key in enumerate(self._keys)}
+        self._removed = 0
+        inc('model_rebuilds_total', model='search_index_compaction')
+
+    # Make the index hold exactly records ({key: record}), touching only
+    # documents that were added, changed or removed
+    def sync(self, records):
+        with self._lock:
+            changed = 0
+            for key in [key for key in self._docs if key not in records]:
+                changed += self.remove(key)
+            for key, record in records.items():
+                changed += self.add(key, record)
+        return changed
+
+    # Top k documents for a free-text query as [(key, score)], best first
+    def search(self, query, k=10):
+        with stage('search'), self._lock:
+            n_docs = len(self._docs)
+            term_ids = {self._terms[token] for token in tokenize(query) if token in self._terms}
+            term_ids = [term_id for term_id in term_ids if self._df[term_id] > 0]
+            if not n_docs or not term_ids or k <= 0:
+                return []
+
+            k1, b = self.k1, self.b
+            lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+            length_norm = k1 * (1 - b + b * lengths / (self._total_length / n_docs))
+            alive = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+
+            # Rarest first; a term's upper bound is its best tf in the shortest possible document
+            terms = []
+            for term_id in term_ids:
+                df = self._df[term_id]
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                max_tf = self._max_tf[term_id]
+                terms.append((df, term_id, idf, idf * max_tf * (k1 + 1) / (max_tf + k1 * (1 - b))))
+            terms.sort()
+
+            scores = np.zeros(len(lengths))
+            remaining = sum(term[3] for term in terms)
+            candidates = None
+            for _, term_id, idf, upper_bound in terms:
+                remaining = max(remaining - upper_bound, 0.0)
+                docs = np.frombuffer(self._postings[term_id], dtype=np.uint32)
+                tfs = np.frombuffer(self._frequencies[term_id], dtype=np.uint16)
+                if candidates is None:
+                    keep = alive[docs]
+                    docs, tfs = docs[keep], tfs[keep]
+                else:
+                    positions = np.minimum(np.searchsorted(docs, candidates), len(docs) - 1)
+                    found = docs[positions] == candidates
+                    docs, tfs = candidates[found], tfs[positions[found]]
+                scores[docs] += idf * tfs * (k1 + 1) / (tfs + length_norm[docs])
+
+                scored = np.flatnonzero(scores) if candidates is None else candidates
+                if len(scored) < k or not remaining:
+                    continue
+                threshold = np.partition(scores[scored], len(scored) - k)[len(scored) - k]
+                if candidates is not None or remaining < threshold:
+                    candidates = scored[scores[scored] + remaining >= threshold]
+
+            if candidates is None:
+                candidates = np.flatnonzero(scores)
+            top, top_scores = top_k_indices(scores[candidates], k)
+            return [(self._keys[doc], float(score)) for doc, score in zip(candidates[top], top_scores)]
+
+    # Completions of the query's last word, most common terms first
+    def suggest(self, query, limit=10):
+        tokens = tokenize(query)
+        if not tokens or not query or not query[-1].isalnum():
+            return []
+        prefix = tokens[-1]
+        with self._lock:
+            start = bisect.bisect_left(self._vocabulary, prefix)
+            end = bisect.bisect_left(self._vocabulary, prefix + '\U0010ffff')
+            matches = [(self._df[self._terms[term]], term) for term in self._vocabulary[start:end]]
+        matches = sorted((match for match in matches if match[0] > 0), key=lambda match: (-match[0], match[1]))
+        return [' '.join(tokens[:-1] + [term]) for _, term in matches[:limit]]
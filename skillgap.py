@@ -0,0 +1,165 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from metrics import inc, stage
+
+
+# Comma-separated skill lists on each course
+COURSE_SKILL_COLUMNS = ('skills_required', 'sub_skills_required')
+
+
+def skill_key(skill):
+    return ' '.join(skill.split()).casefold()
+
+
+def split_skills(text):
+    if not isinstance(text, str):
+        return []
+    return [skill.strip() for skill in text.split(',') if skill.strip()]
+
+
+# Skill gap analysis over a precompiled skill vocabulary.
+#
+# Every distinct skill in the course and subdomain skill columns gets one bit,
+# and every course, job role and subdomain is stored as a Python int with the
+# bits of its skills set, so coverage is an AND and a popcount (bit_count).
+# A job role needs the union of its courses' skills, plus a subdomain's
+# skills when one is given. The course plan is a greedy weighted set cover of
+# the missing skills, costing each course its duration_hours.
+class SkillGapIndex:
+    def __init__(self, courses_df, subdomains_df=None):
+        self.courses_df = courses_df
+        self._bits = {}
+        self.skill_names = []
+
+        self.course_bits = [self._encode_new(skills) for skills in self._course_skills(courses_df)]
+        if 'duration_hours' in courses_df:
+            costs = pd.to_numeric(courses_df['duration_hours'], errors='coerce').to_numpy(dtype=np.float64)
+        else:
+            costs = np.ones(len(courses_df))
+        self.costs = np.where(np.isfinite(costs) & (costs > 0), costs, 1.0)
+
+        self.role_bits = {}
+        for job_role, bits in zip(courses_df['job_role'], self.course_bits):
+            self.role_bits[job_role] = self.role_bits.get(job_role, 0) | bits
+
+        self.subdomain_bits = {}
+        if subdomains_df is not None:
+            for subdomain_id, skills in zip(subdomains_df['subdomain_id'], subdomains_df['skills']):
+                self.subdomain_bits[subdomain_id] = self._encode_new(split_skills(skills))
+
+        # Courses teaching each skill, so a plan only looks at courses that can help
+        self.skill_courses = [[] for _ in self.skill_names]
+        for row, bits in enumerate(self.course_bits):
+            for bit in self.decode_bits(bits):
+                self.skill_courses[bit].append(row)
+        inc('model_rebuilds_total', model='skill_gap')
+
+    @staticmethod
+    def _course_skills(courses_df):
+        columns = [courses_df[column] if column in courses_df else pd.Series('', index=courses_df.index)
+                   for column in COURSE_SKILL_COLUMNS]
+        for texts in zip(*columns):
+            yield [skill for text in texts for skill in split_skills(text)]
+
+    def _encode_new(self, skills):
+        bits = 0
+        for skill in skills:
+            key = skill_key(skill)
+            bit = self._bits.get(key)
+            if bit is None:
+                bit = self._bits[key] = len(self.skill_names)
+                self.skill_names.append(skill)
+            bits |= 1 << bit
+        return bits
+
+    # Bitset of the known skills, and the skills not in the vocabulary
+    def encode(self, skills):
+        bits = 0
+        unknown = []
+        for skill in skills:
+            bit = self._bits.get(skill_key(skill))
+            if bit is None:
+                unknown.append(skill)
+            else:
+                bits |= 1 << bit
+        return bits, unknown
+
+    @staticmethod
+    def decode_bits(bits):
+        positions = []
+        while bits:
+            low = bits & -bits
+            positions.append(low.bit_length() - 1)
+            bits ^= low
+        return positions
+
+    def names(self, bits):
+        return [self.skill_names[bit] for bit in self.decode_bits(bits)]
+
+    def target(self, job_role, subdomain_id=None):
+        return self.role_bits.get(job_role, 0) | self.subdomain_bits.get(subdomain_id, 0)
+
+    # Greedy weighted set cover: repeatedly take the course with the most
+    # missing skills per hour. Gains only shrink as skills get covered, so a
+    # heap of stale gains is re-checked lazily instead of rescoring every
+    # course each round. Courses made redundant by later picks are dropped.
+    def cover(self, gap, max_courses=None):
+        candidates = set()
+        for bit in self.decode_bits(gap):
+            candidates.update(self.skill_courses[bit])
+
+        heap = []
+        for row in candidates:
+            gain = (self.course_bits[row] & gap).bit_count()
+            heap.append((-gain / self.costs[row], row, gain))
+        heapq.heapify(heap)
+
+        remaining = gap
+        chosen = []
+        while remaining and heap and (max_courses is None or len(chosen) < max_courses):
+            _, row, gain = heapq.heappop(heap)
+            current = (self.course_bits[row] & remaining).bit_count()
+            if current == gain:
+                chosen.append(row)
+                remaining &= ~self.course_bits[row]
+            elif current:
+                heapq.heappush(heap, (-current / self.costs[row], row, current))
+
+        # Most expensive first, drop any course whose skills other picks also cover
+        covering = np.zeros(len(self.skill_names), dtype=np.int32)
+        chosen_skills = {row: self.decode_bits(self.course_bits[row] & gap) for row in chosen}
+        for skills in chosen_skills.values():
+            covering[skills] += 1
+        for row in sorted(chosen, key=lambda row: -self.costs[row]):
+            skills = chosen_skills[row]
+            if (covering[skills] > 1).all():
+                covering[skills] -= 1
+                chosen.remove(row)
+        return chosen, remaining
+
+    # Missing skills for a job role (and optionally a subdomain) and the
+    # courses that cover them, as a JSON-ready dict
+    def plan(self, skills, job_role, subdomain_id=None, max_courses=None):
+        with stage('skill_gap'):
+            known, unknown = self.encode(skills)
+            target = self.target(job_role, subdomain_id)
+            gap = target & ~known
+            chosen, uncovered = self.cover(gap, max_courses)
+
+            courses = self.courses_df.iloc[chosen].to_dict(orient='records')
+            for course, row in zip(courses, chosen):
+                course['covers'] = self.names(self.course_bits[row] & gap)
+            return {
+                'job_role': job_role,
+                'subdomain_id': subdomain_id,
+                'target_skills': self.names(target),
+                'matched_skills': self.names(target & known),
+                'unrecognized_skills': unknown,
+                'missing_skills': self.names(gap),
+                'uncovered_skills': self.names(uncovered),
+                'courses': courses,
+                'total_hours': float(sum(self.costs[row] for row in chosen)),
+            }
@@ -0,0 +1,114 @@
+import importlib
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Defer the analytics stack (pygwalker, plotly, eda, WData) until a route needs it
+LAZY_STARTUP = os.environ.get('LAZY_STARTUP', '1') == '1'
+
+# Preload deferred imports and data in the background once traffic is flowing
+WARMUP = os.environ.get('WARMUP', '1') == '1'
+
+_process_start = time.perf_counter()
+_records = []
+_records_lock = threading.Lock()
+_lazy_lock = threading.RLock()
+_lazy_values = {}
+_lazy_loaders = {}
+
+
+# Record how long a block took, as an 'import' or a 'data' load
+@contextmanager
+def timed(kind, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        finished = time.perf_counter()
+        with _records_lock:
+            _records.append({
+                'kind': kind,
+                'name': name,
+                'seconds': round(finished - started, 4),
+                'at': round(started - _process_start, 4),
+                'thread': threading.current_thread().name,
+            })
+
+
+# Import a module on first use, timing the import
+def lazy_import(name):
+    module = sys.modules.get(name)
+    if module is not None and not _initializing(module):
+        return module
+    with _lazy_lock:
+        if name in sys.modules:
+            # Another thread may still be running its body; import_module waits for it
+            return importlib.import_module(name)
+        with timed('import', name):
+            return importlib.import_module(name)
+
+
+# Modules are in sys.modules while their body runs, before they are usable
+def _initializing(module):
+    return getattr(getattr(module, '__spec__', None), '_initializing', False)
+
+
+# Register a dataset loader; the returned function loads it once on first call
+def lazy_load(name, loader):
+    _lazy_loaders[name] = loader
+
+    def get():
+        if name in _lazy_values:
+            return _lazy_values[name]
+        with _lazy_lock:
+            if name not in _lazy_values:
+                with timed('data', name):
+                    _lazy_values[name] = loader()
+            return _lazy_values[name]
+
+    return get
+
+
+_warmup_started = False
+
+
+# Preload deferred modules and datasets in a daemon thread, once per process
+def start_warmup(modules, loaders):
+    global _warmup_started
+    with _lazy_lock:
+        if _warmup_started:
+            return
+        _warmup_started = True
+
+    def run():
+        for name in modules:
+            lazy_import(name)
+        for load in loaders:
+            load()
+
+    threading.Thread(target=run, name='startup-warmup', daemon=True).start()
+
+
+def report():
+    with _records_lock:
+        records = list(_records)
+    return {
+        'lazy_startup': LAZY_STARTUP,
+        'pid': os.getpid(),
+        'imports': [record for record in records if record['kind'] == 'import'],
+        'data': [record for record in records if record['kind'] == 'data'],
+        'import_seconds': round(sum(record['seconds'] for record in records if record['kind'] == 'import'), 4),
+        'data_seconds': round(sum(record['seconds'] for record in records if record['kind'] == 'data'), 4),
+    }
+
+
+def format_report():
+    summary = report()
+    lines = [f"Startup timing (pid {summary['pid']}, lazy={summary['lazy_startup']}):"]
+    for record in summary['imports'] + summary['data']:
+        lines.append(f"  {record['kind']:<6} {record['name']:<45} {record['seconds']:>8.3f}s  [{record['thread']}]")
+    lines.append(f"  imports {summary['import_seconds']:.3f}s, data {summary['data_seconds']:.3f}s")
+    return '\n'.join(lines)
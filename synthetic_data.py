@@ -1,3 +1,7 @@
+import argparse
+import itertools
+import os
+
 import pandas as pd
 import numpy as np
 
@@ -68,33 +72,101 @@ skills_dict = {
     }
 }
 
-def generate_courses_data(num_courses):
-    courses = []
-    course_id = 1
-    for job_role in np.random.choice(job_roles, num_courses):
-        main_skills = skills_dict[job_role]['main']
-        sub_skills = skills_dict[job_role]['sub']
-        skills_required = ', '.join(np.random.choice(main_skills, size=np.random.randint(1, 3), replace=False))
-        sub_skills_required = ', '.join(np.random.choice(sub_skills, size=np.random.randint(1, 3), replace=False))
-        course_title = f'{job_role} Course {course_id}'
-        course_description = f'This course covers essential skills for the role of {job_role}. Skills required: {skills_required}. Sub-skills required: {sub_skills_required}.'
-        courses.append({
-            'course_id': course_id,
-            'title': course_title,
-            'job_role': job_role,
-            'skills_required': skills_required,
-            'sub_skills_required': sub_skills_required,
-            'description': course_description
-        })
-        course_id += 1
-    return pd.DataFrame(courses).drop_duplicates(subset=['job_role', 'skills_required', 'sub_skills_required'])
-
-def generate_synthetic_data():
-    num_courses = 50
-    courses_df = generate_courses_data(num_courses)
+# Every skill string a role can get, as the original per-course sampling drew
+# them: one skill (half the time) or an ordered pair of distinct skills
+def _skill_choices(skills):
+    singles = list(skills)
+    pairs = [', '.join(pair) for pair in itertools.permutations(skills, 2)]
+    return singles + pairs, len(singles)
+
+
+def _choice_table(kind):
+    choices = [_skill_choices(skills_dict[job_role][kind]) for job_role in job_roles]
+    width = max(len(strings) for strings, _ in choices)
+    table = np.full((len(job_roles), width), '', dtype=object)
+    for row, (strings, _) in enumerate(choices):
+        table[row, :len(strings)] = strings
+    n_skills = np.array([n for _, n in choices])
+    return table, n_skills
+
+
+_main_choices = _choice_table('main')
+_sub_choices = _choice_table('sub')
+
+
+def _draw_skills(rng, roles, choices):
+    table, n_skills = choices
+    n = n_skills[roles]
+    single = rng.integers(0, 2, len(roles)) == 0
+    index = np.where(single, rng.integers(0, n), n + rng.integers(0, n * (n - 1)))
+    return table[roles, index]
+
+
+# One chunk of courses with ids first_id.. (vectorized over the chunk)
+def _courses_chunk(rng, first_id, size):
+    roles = rng.integers(0, len(job_roles), size)
+    job_role = np.asarray(job_roles, dtype=object)[roles]
+    course_id = np.arange(first_id, first_id + size)
+    skills_required = _draw_skills(rng, roles, _main_choices)
+    sub_skills_required = _draw_skills(rng, roles, _sub_choices)
+    return pd.DataFrame({
+        'course_id': course_id,
+        'title': job_role + ' Course ' + course_id.astype(str).astype(object),
+        'job_role': job_role,
+        'skills_required': skills_required,
+        'sub_skills_required': sub_skills_required,
+        'description': (
+            'This course covers essential skills for the role of ' + job_role
+            + '. Skills required: ' + skills_required
+            + '. Sub-skills required: ' + sub_skills_required + '.'
+        ),
+    })
+
+
+# Courses in chunks of chunk_size rows, so any number can be produced in constant memory
+def iter_courses(num_courses, chunk_size=100_000, seed=None):
+    rng = np.random.default_rng(seed)
+    for first in range(0, num_courses, chunk_size):
+        yield _courses_chunk(rng, first + 1, min(chunk_size, num_courses - first))
+
+
+def generate_courses_data(num_courses, seed=None):
+    courses_df = pd.concat(iter_courses(num_courses, seed=seed), ignore_index=True)
+    return courses_df.drop_duplicates(subset=['job_role', 'skills_required', 'sub_skills_required'])
+
+
+# Stream courses to a CSV chunk by chunk; returns the number of rows written
+def write_courses_csv(path, num_courses, chunk_size=100_000, seed=None):
+    written = 0
+    tmp = f'{path}.{os.getpid()}.tmp'
+    for chunk in iter_courses(num_courses, chunk_size, seed):
+        chunk.to_csv(tmp, mode='a' if written else 'w', header=not written, index=False)
+        written += len(chunk)
+    if not written:
+        # No rows to stream; still write the header
+        _courses_chunk(np.random.default_rng(seed), 1, 0).to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    return written
+
+
+def generate_synthetic_data(num_courses=50, seed=None, path='courses.csv'):
+    courses_df = generate_courses_data(num_courses, seed)
     
     # Save to CSV files
-    courses_df.to_csv('courses.csv', index=False)
+    courses_df.to_csv(path, index=False)
+    return len(courses_df)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic course catalog.')
+    parser.add_argument('--courses', type=int, help='stream this many courses (no de-duplication) instead of the 50-course catalog')
+    parser.add_argument('--chunk-size', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--out', default='courses.csv', help='CSV file to write (default: courses.csv)')
+    args = parser.parse_args()
 
-# Run data generation
-generate_synthetic_data()
+    if args.courses is None:
+        written = generate_synthetic_data(seed=args.seed, path=args.out)
+    else:
+        written = write_courses_csv(args.out, args.courses, args.chunk_size, args.seed)
+    print(f"Wrote {written} courses to {args.out}.")
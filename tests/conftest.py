@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The modules read their CSVs and stores relative to the repository root;
+# tests that import them must not leave files behind
+os.environ.setdefault('METRICS_DIR', os.path.join(ROOT, '.pytest_cache', 'metrics'))
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    monkeypatch.chdir(ROOT)
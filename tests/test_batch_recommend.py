@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from batch_recommend import item_cf_scores, ranked_lists
+from item_similarity import ItemSimilarity
+from ratings_matrix import RatingsMatrix
+
+
+def make_ratings(n_users=40, n_courses=25, per_user=8, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for user_id in range(1, n_users + 1):
+        for course_id in rng.choice(np.arange(1, n_courses + 1), per_user, replace=False):
+            rows.append((user_id, int(course_id), int(rng.integers(1, 6)), '2024-01-01'))
+    return pd.DataFrame(rows, columns=['user_id', 'course_id', 'rating', 'timestamp'])
+
+
+def test_rated_courses_never_recommended():
+    ratings_df = make_ratings()
+    ratings_matrix = RatingsMatrix.from_frame(ratings_df)
+    item_similarity = ItemSimilarity(ratings_matrix, k=5)
+    user_ids = list(ratings_matrix.user_ids)
+
+    # k larger than the unrated courses, so the rated ones would fill the tail
+    results = ranked_lists(item_cf_scores(item_similarity, ratings_matrix, user_ids), ratings_matrix.course_ids, 25)
+    for user_id, recs in zip(user_ids, results):
+        rated = set(ratings_df.loc[ratings_df['user_id'] == user_id, 'course_id'])
+        assert recs
+        assert not rated & {rec['course_id'] for rec in recs}
+        assert all(np.isfinite(rec['score']) for rec in recs)
+
+
+def test_unknown_users_get_empty_lists():
+    ratings_matrix = RatingsMatrix.from_frame(make_ratings())
+    item_similarity = ItemSimilarity(ratings_matrix)
+    results = ranked_lists(item_cf_scores(item_similarity, ratings_matrix, [None, -1]), ratings_matrix.course_ids, 10)
+    assert results == [[], []]
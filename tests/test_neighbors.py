@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+import neighbors
+from neighbors import CF_NEIGHBORS, UserNeighbors
+from ratings import iter_ratings, make_user_ids
+from ratings_matrix import RatingsMatrix
+
+
+def neighbor_sets(index, user_ids, exact):
+    min_users = neighbors.LSH_MIN_USERS
+    neighbors.LSH_MIN_USERS = 10 ** 9 if exact else 0
+    try:
+        return [set(index.query(user_id, CF_NEIGHBORS)[0].tolist()) for user_id in user_ids]
+    finally:
+        neighbors.LSH_MIN_USERS = min_users
+
+
+# The default LSH parameters must find most of the neighbors an exact scan finds
+def test_default_lsh_recall():
+    user_ids = make_user_ids(4000, seed=1)
+    ratings_df = pd.concat(iter_ratings(user_ids, np.arange(1, 301), 50_000, seed=1))
+    ratings_matrix = RatingsMatrix.from_frame(ratings_df)
+    index = UserNeighbors(ratings_matrix)
+
+    sample = np.random.default_rng(0).choice(ratings_matrix.user_ids, 200, replace=False).tolist()
+    exact = neighbor_sets(index, sample, exact=True)
+    approximate = neighbor_sets(index, sample, exact=False)
+    recall = sum(len(a & e) for a, e in zip(approximate, exact)) / sum(len(e) for e in exact)
+    assert recall >= 0.85, recall
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from item_similarity import ItemSimilarity
+from ratings_matrix import RatingsMatrix
+
+
+def random_log(rng, n, n_users, n_courses, start=0):
+    return pd.DataFrame({
+        'user_id': rng.integers(1, n_users + 1, n),
+        'course_id': rng.integers(1, n_courses + 1, n),
+        'rating': rng.integers(1, 6, n),
+        'timestamp': np.arange(start, start + n),
+    })
+
+
+# Upserts (overwrites, new pairs, new users and courses) must leave the same
+# matrix and co-rating table as building both from the whole log
+def test_incremental_updates_match_rebuild():
+    rng = np.random.default_rng(0)
+    history = random_log(rng, 300, 30, 20)
+    ratings_matrix = RatingsMatrix.from_frame(history)
+    item_similarity = ItemSimilarity(ratings_matrix, k=5)
+    handed_out = ratings_matrix.matrix()
+
+    updates = random_log(rng, 200, 40, 25, start=len(history))
+    for user_id, course_id, rating in zip(updates['user_id'], updates['course_id'], updates['rating']):
+        previous = ratings_matrix.upsert(user_id, course_id, rating)
+        item_similarity.update(user_id, course_id, previous, rating)
+        if rng.random() < 0.1:
+            item_similarity.table()
+
+    rebuilt = RatingsMatrix.from_frame(pd.concat([history, updates]))
+    order = [rebuilt.user_index[user_id] for user_id in ratings_matrix.user_ids]
+    columns = [rebuilt.course_index[course_id] for course_id in ratings_matrix.course_ids]
+    expected = rebuilt.matrix().toarray()[np.ix_(order, columns)]
+    np.testing.assert_array_equal(ratings_matrix.matrix().toarray(), expected)
+
+    fresh = ItemSimilarity(ratings_matrix, k=5)
+    np.testing.assert_allclose(item_similarity._gram, fresh._gram)
+    np.testing.assert_allclose(item_similarity.table().toarray(), fresh.table().toarray())
+
+    # Matrices handed out earlier keep their shape
+    assert handed_out.shape != ratings_matrix.shape
+
+
+def test_user_ratings_include_pending():
+    ratings_matrix = RatingsMatrix.from_frame(random_log(np.random.default_rng(1), 50, 5, 5))
+    ratings_matrix.upsert(99, 7, 4)
+    cols, values = ratings_matrix.user_ratings(99)
+    assert [ratings_matrix.course_ids[col] for col in cols] == [7]
+    assert values.tolist() == [4]
+    assert ratings_matrix.get(99, 7) == 4
@@ -0,0 +1,43 @@
+import pytest
+
+
+@pytest.fixture
+def rs(monkeypatch):
+    import recommendation_system
+    monkeypatch.setattr(recommendation_system, 'SUBDOMAIN_CACHE_SIZE', 2)
+    recommendation_system._model_cache.clear()
+    yield recommendation_system
+    recommendation_system._model_cache.clear()
+
+
+def subdomain_ids(rs, n):
+    return [int(subdomain_id) for subdomain_id in rs.subdomains_df['subdomain_id'].unique()[:n]]
+
+
+def test_hit_returns_cached_model(rs):
+    first, = subdomain_ids(rs, 1)
+    assert rs.get_subdomain_model(first) is rs.get_subdomain_model(first)
+
+
+def test_least_recently_used_model_is_evicted(rs):
+    a, b, c = subdomain_ids(rs, 3)
+    rs.get_subdomain_model(a)
+    rs.get_subdomain_model(b)
+    rs.get_subdomain_model(a)
+    rs.get_subdomain_model(c)
+    assert list(rs._model_cache) == [a, c]
+
+
+def test_model_built_from_replaced_catalog_is_not_cached(rs, monkeypatch):
+    first, = subdomain_ids(rs, 1)
+    build = rs._build_subdomain_model
+
+    # The catalog is reloaded while the model is being fitted
+    def build_during_reload(*args):
+        model = build(*args)
+        monkeypatch.setattr(rs, 'catalog_version', rs.catalog_version + 1)
+        return model
+
+    monkeypatch.setattr(rs, '_build_subdomain_model', build_during_reload)
+    assert rs.get_subdomain_model(first) is not None
+    assert first not in rs._model_cache
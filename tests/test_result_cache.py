@@ -0,0 +1,89 @@
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+from result_cache import ResultCache
+
+
+def done(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+def get(cache, key, version, value):
+    return cache.submit(key, version, lambda: done(value)).result()
+
+
+def test_size_stays_within_max_bytes():
+    cache = ResultCache('test', max_bytes=3000)
+    for key in range(4):
+        get(cache, key, 0, np.zeros(100))
+    assert list(cache._entries) == [1, 2, 3]
+    assert cache.size == 2400
+
+    # A hit moves the entry to the back, so the next insert evicts 2 instead
+    get(cache, 1, 0, None)
+    get(cache, 4, 0, np.zeros(100))
+    assert list(cache._entries) == [3, 1, 4]
+    assert cache.size <= cache.max_bytes
+
+
+def test_oversized_result_is_returned_but_not_stored():
+    cache = ResultCache('test', max_bytes=1000)
+    get(cache, 'small', 0, np.zeros(10))
+    value = get(cache, 'big', 0, np.zeros(1000))
+    assert len(value) == 1000
+    assert list(cache._entries) == ['small']
+    assert cache.size == 80
+
+
+def test_stale_version_is_recomputed_and_replaced():
+    cache = ResultCache('test', max_bytes=10000)
+    assert get(cache, 'key', 1, np.zeros(10)).sum() == 0
+    assert get(cache, 'key', 2, np.ones(10)).sum() == 10
+    assert get(cache, 'key', 2, np.zeros(10)).sum() == 10
+    assert len(cache) == 1
+    assert cache.size == 80
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = ResultCache('test')
+    task = Future()
+    calls = []
+
+    def start():
+        calls.append(1)
+        return task
+
+    futures = []
+    threads = [threading.Thread(target=lambda: futures.append(cache.submit('key', 0, start))) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert not any(future.done() for future in futures)
+
+    task.set_result('value')
+    assert [future.result() for future in futures] == ['value'] * 16
+    assert cache.submit('key', 0, start).result() == 'value'
+    assert calls == [1]
+
+
+def test_failures_are_not_cached():
+    cache = ResultCache('test')
+    task = Future()
+    task.set_exception(ValueError('boom'))
+    with pytest.raises(ValueError):
+        cache.submit('key', 0, lambda: task).result()
+
+    def fail_to_start():
+        raise RuntimeError('no workers')
+
+    with pytest.raises(RuntimeError):
+        cache.submit('key', 0, fail_to_start).result()
+    assert len(cache) == 0
+    assert get(cache, 'key', 0, 'value') == 'value'
@@ -0,0 +1,86 @@
+import math
+
+import numpy as np
+import pytest
+
+from search_index import BM25_B, BM25_K1, SEARCH_FIELDS, SearchIndex, tokenize
+
+WORDS = ['data', 'analisis', 'python', 'keselamatan', 'network', 'cloud', 'pengurusan', 'projek',
+         'machine', 'learning', 'security', 'design', 'rangkaian', 'sql', 'agile', 'testing']
+
+
+def random_records(rng, n, first=0):
+    return {
+        key: {
+            'course_title': ' '.join(rng.choice(WORDS, rng.integers(1, 4))),
+            'course_description': ' '.join(rng.choice(WORDS, rng.integers(3, 20))),
+            'subdomain_name': str(rng.choice(WORDS)),
+        }
+        for key in range(first, first + n)
+    }
+
+
+# Plain BM25 over every document, with the index's field weights
+def brute_force(records, query, k):
+    counts = {}
+    for key, record in records.items():
+        tf = {}
+        for field, weight in SEARCH_FIELDS.items():
+            for token in tokenize(record.get(field)):
+                tf[token] = tf.get(token, 0) + weight
+        counts[key] = tf
+    average = sum(sum(tf.values()) for tf in counts.values()) / len(counts)
+    scores = {}
+    for term in set(tokenize(query)):
+        df = sum(term in tf for tf in counts.values())
+        if not df:
+            continue
+        idf = math.log(1 + (len(counts) - df + 0.5) / (df + 0.5))
+        for key, tf in counts.items():
+            if term in tf:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * sum(tf.values()) / average)
+                scores[key] = scores.get(key, 0.0) + idf * tf[term] * (BM25_K1 + 1) / (tf[term] + norm)
+    return sorted(scores.items(), key=lambda item: -item[1])[:k]
+
+
+def assert_same_ranking(index, records, query, k):
+    got = index.search(query, k)
+    expected = brute_force(records, query, k)
+    np.testing.assert_allclose([score for _, score in got], [score for _, score in expected], rtol=1e-9)
+    # Keys may only differ between documents with equal scores
+    for (got_key, got_score), (key, score) in zip(got, expected):
+        assert got_key == key or math.isclose(got_score, score, rel_tol=1e-9)
+
+
+@pytest.mark.parametrize('k', [1, 5, 20])
+def test_maxscore_matches_brute_force(k):
+    rng = np.random.default_rng(0)
+    records = random_records(rng, 400)
+    index = SearchIndex()
+    index.sync(records)
+    for _ in range(30):
+        assert_same_ranking(index, records, ' '.join(rng.choice(WORDS, rng.integers(1, 5))), k)
+
+
+def test_updates_and_compaction_match_brute_force():
+    rng = np.random.default_rng(1)
+    records = random_records(rng, 300)
+    index = SearchIndex()
+    index.sync(records)
+
+    # Change some documents, drop enough to trigger compaction, add new ones
+    records.update(random_records(rng, 50, first=0))
+    for key in range(100, 200):
+        del records[key]
+    records.update(random_records(rng, 40, first=1000))
+    index.sync(records)
+    assert len(index) == len(records)
+    for _ in range(20):
+        assert_same_ranking(index, records, ' '.join(rng.choice(WORDS, rng.integers(1, 5))), 10)
+
+
+def test_suggest_completes_last_word():
+    index = SearchIndex()
+    index.sync({1: {'course_title': 'python programming'}, 2: {'course_title': 'python projek'}})
+    assert index.suggest('learn pro') == ['learn programming', 'learn projek']
+    assert index.suggest('learn pro ') == []
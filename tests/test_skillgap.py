@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from skillgap import SkillGapIndex
+
+SKILLS = ['Python', 'SQL', 'Statistik', 'Rangkaian', 'Cloud', 'Keselamatan', 'Agile', 'Git',
+          'Docker', 'Excel', 'Komunikasi', 'Pengurusan Projek', 'Linux', 'Java', 'Ujian']
+
+
+def random_catalog(rng, n_courses):
+    def skills(low, high):
+        return ', '.join(rng.choice(SKILLS, rng.integers(low, high), replace=False))
+
+    courses_df = pd.DataFrame({
+        'job_role': rng.choice(['Data Analyst', 'Network Engineer', 'Developer'], n_courses),
+        'skills_required': [skills(1, 4) for _ in range(n_courses)],
+        'sub_skills_required': [skills(0, 3) for _ in range(n_courses)],
+        'duration_hours': rng.integers(1, 40, n_courses),
+    })
+    # Subdomain skills no course teaches
+    subdomains_df = pd.DataFrame({'subdomain_id': [1], 'skills': ['Python, Blockchain, Kuantum']})
+    return courses_df, subdomains_df
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_cover_covers_every_taught_gap_skill(seed):
+    rng = np.random.default_rng(seed)
+    index = SkillGapIndex(*random_catalog(rng, int(rng.integers(5, 40))))
+    taught = 0
+    for bits in index.course_bits:
+        taught |= bits
+
+    for job_role in index.role_bits:
+        known, _ = index.encode(rng.choice(SKILLS, 4, replace=False))
+        gap = index.target(job_role, 1) & ~known
+        chosen, remaining = index.cover(gap)
+
+        covered = 0
+        for row in chosen:
+            covered |= index.course_bits[row]
+        assert remaining == gap & ~taught
+        assert gap & ~covered == remaining
+        assert {'Blockchain', 'Kuantum'} <= set(index.names(remaining))
+
+        # No chosen course is redundant
+        for row in chosen:
+            others = 0
+            for other in chosen:
+                if other != row:
+                    others |= index.course_bits[other]
+            assert index.course_bits[row] & gap & ~others
+
+
+def test_max_courses_limits_the_plan():
+    rng = np.random.default_rng(0)
+    index = SkillGapIndex(*random_catalog(rng, 30))
+    gap = index.target('Developer', 1)
+    chosen, remaining = index.cover(gap, max_courses=1)
+    assert len(chosen) == 1
+    assert remaining == gap & ~index.course_bits[chosen[0]]
+
+
+def test_encode_is_case_and_space_insensitive():
+    courses_df = pd.DataFrame({'job_role': ['Developer'], 'skills_required': ['Pengurusan Projek, SQL']})
+    index = SkillGapIndex(courses_df)
+    bits, unknown = index.encode(['  pengurusan   projek', 'sql', 'Rust'])
+    assert bits == index.course_bits[0]
+    assert unknown == ['Rust']